@@ -438,6 +438,15 @@ def convert_pdf_to_excel():
                         'metadata': table.get('metadata', {})
                     }
                     tables_for_excel.append(table_with_page)
+            elif page_result['success']:
+                # Blank page or no tables found: keep the one-sheet-per-page layout
+                reason = 'Blank page' if page_result.get('metadata', {}).get('skipped') == 'blank' else 'No tables found'
+                tables_for_excel.append({
+                    'table_id': page_result['page_number'],
+                    'page_number': page_result['page_number'],
+                    'headers': ['Note'],
+                    'data': [[f"{reason} on page {page_result['page_number']}"]]
+                })
             else:
                 # Add empty sheet for failed pages
                 logger.warning(f"Page {page_result['page_number']} failed: {page_result.get('error', 'Unknown')}")
@@ -452,7 +461,6 @@ def convert_pdf_to_excel():
             # Clean up
             if os.path.exists(input_path):
                 os.remove(input_path)
-            extractor.cleanup_temp_files(result.get('temp_dir', ''), result.get('image_paths', []))
             return jsonify({'error': 'No tables extracted from any page'}), 404
         
         # Generate Excel with custom multi-sheet logic
@@ -496,13 +504,12 @@ def convert_pdf_to_excel():
         logger.info(f"   Sheets: {len(tables_for_excel)} | Processing time: {result['processing_time']:.2f}s")
         
         # Increment usage counter (successful conversion)
-        usage_info = tracker.increment_usage()
+        usage_info = tracker.increment_usage(return_info=True)
         logger.info(f"📊 Usage updated: {usage_info['used']}/{usage_info['limit']} ({usage_info['remaining']} remaining)")
         
-        # Clean up temporary files
+        # Clean up the uploaded PDF (pages were rendered in memory)
         if os.path.exists(input_path):
             os.remove(input_path)
-        extractor.cleanup_temp_files(result.get('temp_dir', ''), result.get('image_paths', []))
         
         # Send Excel file with metadata in headers
         response = send_file(
@@ -535,11 +542,6 @@ def convert_pdf_to_excel():
             os.remove(input_path)
         if 'output_path' in locals() and os.path.exists(output_path):
             os.remove(output_path)
-        if 'result' in locals() and 'temp_dir' in result:
-            try:
-                extractor.cleanup_temp_files(result.get('temp_dir', ''), result.get('image_paths', []))
-            except:
-                pass
         
         return jsonify({
             'error': 'Internal server error',
@@ -574,7 +576,7 @@ def get_pdf_quota():
             'features': {
                 'max_pages_per_pdf': 25,
                 'estimated_time_20_pages': '4-8 seconds',
-                'model': 'gemini-2.5-flash'
+                'model': 'gemini-2.5-flash-lite (gemini-2.5-flash fallback)'
             }
         })
     except Exception as e:
@@ -656,11 +658,7 @@ def generate_tts():
         voice = data.get('voice', 'Kore')
         style = data.get('style', '')
         language = data.get('language', 'en-US')
-        temperature = float(data.get('temperature', 0.7))
-        
-        # Validate temperature
-        if temperature < 0.0 or temperature > 2.0:
-            temperature = 0.7
+        temperature = data.get('temperature', 0.7)  # Clamped to 0.0-2.0 by the TTS service
         
         logger.info(f"🎤 TTS Request: {len(text)} chars, voice={voice}, lang={language}")
         
@@ -675,7 +673,9 @@ def generate_tts():
         )
         
         if not result.get('success'):
-            return jsonify({'error': result.get('error', 'Speech generation failed')}), 500
+            # Rejected input (too long, unsupported language, ...) is the client's fault
+            status = 400 if result.get('type') == 'ValidationError' else 500
+            return jsonify({'error': result.get('error', 'Speech generation failed')}), status
         
         logger.info(f"✓ TTS generated: {result['filename']} ({result['file_size']:,} bytes)")
         
@@ -731,7 +731,7 @@ def generate_tts_dialog():
         speakers = data.get('speakers', [])
         transcript = data.get('transcript', '').strip()
         language = data.get('language', 'en-US')
-        temperature = float(data.get('temperature', 0.7))
+        temperature = data.get('temperature', 0.7)  # Clamped to 0.0-2.0 by the TTS service
         
         if not speakers:
             return jsonify({'error': 'No speakers provided'}), 400
@@ -750,7 +750,8 @@ def generate_tts_dialog():
         )
         
         if not result.get('success'):
-            return jsonify({'error': result.get('error', 'Dialog generation failed')}), 500
+            status = 400 if result.get('type') == 'ValidationError' else 500
+            return jsonify({'error': result.get('error', 'Dialog generation failed')}), status
         
         logger.info(f"✓ Dialog generated: {result['filename']} ({result['file_size']:,} bytes)")
         
@@ -0,0 +1,76 @@
+"""
+Disk Cache Maintenance Helpers
+Keeps the on-disk result caches (page_cache/, audio_cache/) from growing without bound
+
+Features:
+- Age-based expiry (entries older than the TTL are deleted, not just ignored)
+- Optional entry-count and total-size caps (oldest entries evicted first)
+- Safe to run concurrently from several threads/workers (vanished files are skipped)
+"""
+
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def prune_cache_dir(directory, max_age, max_entries=None, max_bytes=None):
+    """
+    Delete expired cache files, then evict the oldest until the caps are met.
+
+    Leftover `.tmp` files from interrupted writes are treated like any other
+    entry, so they expire with the TTL too.
+
+    Args:
+        directory (str | Path): Cache directory to prune
+        max_age (float): Seconds since last write after which an entry is deleted
+        max_entries (int, optional): Maximum number of files to keep
+        max_bytes (int, optional): Maximum total size of the kept files
+
+    Returns:
+        int: Number of files removed
+    """
+    cutoff = time.time() - max_age
+    entries = []
+    removed = 0
+
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue  # Removed by another worker mid-scan
+                if st.st_mtime < cutoff:
+                    removed += _remove(entry.path)
+                else:
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+    except OSError as e:
+        logger.warning(f"Cache prune failed for {directory}: {e}")
+        return removed
+
+    total_bytes = sum(size for _, size, _ in entries)
+    over_entries = max_entries is not None and len(entries) > max_entries
+    over_bytes = max_bytes is not None and total_bytes > max_bytes
+    if over_entries or over_bytes:
+        entries.sort()  # Oldest first
+        kept = len(entries)
+        for _, size, path in entries:
+            if (max_entries is None or kept <= max_entries) and (max_bytes is None or total_bytes <= max_bytes):
+                break
+            removed += _remove(path)
+            kept -= 1
+            total_bytes -= size
+
+    return removed
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return 1
+    except OSError:
+        return 0
@@ -6,9 +6,14 @@ Features:
 - 30 professional voices with distinct personalities
 - Natural language style control ("Say cheerfully:", "Say professionally:")
 - Multi-speaker dialog support (up to 2 speakers)
+- Concurrent batch synthesis (asyncio fan-out, bounded concurrency)
 - 24 languages with regional accents
 - WAV audio output (24kHz, 16-bit PCM)
 - Temperature control for speech variation
+- Optional silence trim + peak normalization (NumPy, vectorized)
+- Persistent keep-alive HTTP session (HTTP/2 when `h2` is installed)
+- Token-bucket rate limiting (RPM + approximate TPM) with 429 backoff
+- Content-addressed audio cache (repeat phrases skip the API call)
 - Production-ready error handling
 
 High-Impact Parameters (User-Facing):
@@ -23,16 +28,67 @@ Lower Impact Parameters (Hidden/Auto):
 - System Instructions: Auto-generated based on voice
 """
 
-from google import genai
-from google.genai import types
+import importlib.util
 import wave
 import os
+import asyncio
+import secrets
+import itertools
+import shutil
+import hashlib
+import threading
+import struct
 import logging
 from pathlib import Path
-from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limiter import TokenBucket, call_with_backoff
+from disk_cache import prune_cache_dir
+
+# Optional: vectorized PCM post-processing
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
+# RIFF header, fmt chunk (PCM), data chunk header: 44 bytes
+_WAV_HEADER = struct.Struct('<4sI4s4sIHHIIHH4sI')
+_IOV_MAX = 1024
+
+
+def _write_all(fd: int, buffers: list):
+    """Write every buffer to fd: one writev when possible, plain writes for any remainder"""
+    written = 0
+    if hasattr(os, 'writev') and len(buffers) <= _IOV_MAX:  # writev is POSIX-only
+        written = os.writev(fd, buffers)
+    
+    # Finish a short writev (or the non-POSIX path) buffer by buffer
+    for buf in buffers:
+        if written >= len(buf):
+            written -= len(buf)
+            continue
+        view = memoryview(buf)[written:]
+        written = 0
+        while view:
+            view = view[os.write(fd, view):]
+
+
+def _build_voices_catalog(voices: dict, voice_types: tuple) -> dict:
+    """Group the voice table by type for the frontend catalog"""
+    categorized = defaultdict(list)
+    for voice_name, voice_info in voices.items():
+        categorized[voice_info['type']].append({'name': voice_name, **voice_info})
+    
+    return {
+        'total_voices': len(voices),
+        'categories': dict(categorized),
+        'voice_types': voice_types
+    }
+
 
 class GeminiTTSService:
     """
@@ -92,6 +148,9 @@ class GeminiTTSService:
         'Zubenelgenubi': {'type': 'special', 'gender': 'male', 'trait': 'Casual', 'best_for': 'Conversational, informal'}
     }
     
+    # Fast membership checks for request validation
+    _VOICE_NAMES = frozenset(VOICES)
+    
     # Language support (24 languages)
     LANGUAGES = {
         'en-US': 'English (United States)',
@@ -119,6 +178,40 @@ class GeminiTTSService:
         'tr-TR': 'Turkish (Turkey)',
         'vi-VN': 'Vietnamese (Vietnam)'
     }
+    _LANG_CODES = frozenset(LANGUAGES)
+    
+    # Input limits (also keeps one request well inside the TPM budget)
+    MAX_TEXT_CHARS = 5000
+    DEFAULT_TEMPERATURE = 0.7
+    
+    # VOICES/LANGUAGES never change at runtime, so the catalog responses are built once
+    _VOICE_TYPES = tuple(dict.fromkeys(v['type'] for v in VOICES.values()))  # Insertion order
+    _VOICES_CATALOG = _build_voices_catalog(VOICES, _VOICE_TYPES)
+    _LANGUAGES_CATALOG = {
+        'total': len(LANGUAGES),
+        'languages': LANGUAGES
+    }
+    
+    # Output audio format: Gemini TTS returns raw 16-bit little-endian mono PCM
+    SAMPLE_RATE = 24000  # Fallback when the MIME type carries no rate= parameter
+    SAMPLE_WIDTH = 2     # 16-bit
+    CHANNELS = 1         # Mono
+    _BYTES_PER_FRAME = SAMPLE_WIDTH * CHANNELS
+    WAV_HEADER_SIZE = _WAV_HEADER.size  # 44 bytes: RIFF + fmt (PCM) + data chunk headers
+    _PCM_MIME_TYPES = frozenset({'audio/l16', 'audio/pcm'})
+    
+    # Post-processing (postprocess=True)
+    SILENCE_THRESHOLD = 300  # |sample| at or below this counts as silence
+    NORMALIZE_PEAK = 30000   # Target peak amplitude (~-0.8 dBFS)
+    
+    # Rate limits: 90% of the free-tier quota by default, override for paid tiers
+    RPM_LIMIT = int(os.getenv('GEMINI_TTS_RPM', 90))
+    TPM_LIMIT = int(os.getenv('GEMINI_TTS_TPM', 27000))
+    
+    # Audio cache bounds: entries expire after a week; oldest evicted beyond the size cap
+    AUDIO_CACHE_TTL = 7 * 86400
+    AUDIO_CACHE_MAX_BYTES = 500 * 1024 * 1024
+    AUDIO_CACHE_PRUNE_EVERY = 50  # Re-run the sweep after this many stores
     
     def __init__(self):
         """Initialize Gemini TTS with API key"""
@@ -126,12 +219,72 @@ class GeminiTTSService:
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY environment variable is required")
         
-        self.client = genai.Client(api_key=self.api_key)
+        # Deferred SDK imports: the google.genai/protobuf/transport tree is heavy,
+        # so importing this module stays cheap until a service is actually built
+        from google import genai
+        from google.genai import types
+        import httpx
+        self._genai, self._types = genai, types
+        # Shared VoiceConfig per voice name, built on first use (30 voices at most)
+        self._voice_cfgs = {}
+        
+        # One long-lived connection pool for every request: keep-alive avoids a
+        # TLS handshake per call, HTTP/2 multiplexes concurrent batch requests
+        self._http2 = importlib.util.find_spec('h2') is not None
+        self.client = genai.Client(
+            api_key=self.api_key,
+            http_options=types.HttpOptions(
+                timeout=60_000,  # milliseconds
+                client_args={
+                    'transport': httpx.HTTPTransport(
+                        http2=self._http2,
+                        retries=2,  # connection-level retries only
+                        limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=300)
+                    )
+                }
+            )
+        )
         self.model_name = "gemini-2.5-flash-preview-tts"  # Use Flash for faster generation
         
+        # Output directory is created once; filenames use a per-process sequence
+        # plus a random suffix so same-second requests never collide
+        self._default_output_dir = Path(__file__).parent / 'outputs'
+        self._default_output_dir.mkdir(parents=True, exist_ok=True)
+        self._seen_output_dirs = {self._default_output_dir}
+        self._seq = itertools.count()
+        
+        # Small dedicated pool for WAV writes: bounds concurrent disk writers
+        # and keeps file I/O off event-loop / request-handling threads
+        self._io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='tts-io')
+        
+        # Content-addressed WAV cache: repeat phrases skip the API call entirely
+        self._audio_cache_dir = Path(__file__).parent / 'audio_cache'
+        self._audio_cache_dir.mkdir(parents=True, exist_ok=True)
+        self._cache_stores = itertools.count(1)
+        self._prune_audio_cache()
+        
+        # Shared across threads so concurrent requests respect one quota
+        self._rpm_bucket = TokenBucket(self.RPM_LIMIT)
+        self._tpm_bucket = TokenBucket(self.TPM_LIMIT)
+        
         logger.info(f"✓ Gemini TTS Service initialized: {self.model_name}")
         logger.info(f"  - {len(self.VOICES)} voices available")
         logger.info(f"  - {len(self.LANGUAGES)} languages supported")
+        logger.info(f"  - Rate limit: {self.RPM_LIMIT} RPM, {self.TPM_LIMIT} TPM")
+        logger.info(f"  - HTTP transport: {'HTTP/2' if self._http2 else 'HTTP/1.1'} keep-alive")
+    
+    def close(self):
+        """Release the pooled HTTP connections and the WAV writer threads"""
+        self._io_pool.shutdown(wait=True)
+        close = getattr(self.client, 'close', None)
+        if close:
+            close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
     
     def generate_speech(
         self,
@@ -140,7 +293,8 @@ class GeminiTTSService:
         style_prompt: str = '',
         language_code: str = 'en-US',
         temperature: float = 0.7,
-        output_dir: str = None
+        output_dir: str = None,
+        postprocess: bool = False
     ) -> dict:
         """
         Generate speech from text using Gemini TTS
@@ -152,50 +306,81 @@ class GeminiTTSService:
             language_code: Language code (default: en-US)
             temperature: Speech variation (0.0-2.0, default: 0.7)
             output_dir: Directory to save WAV file
+            postprocess: Trim leading/trailing silence and peak-normalize (requires NumPy)
         
         Returns:
             dict with success, audio_path, file_size, duration, etc.
         """
         try:
-            # Validate inputs
+            # Validate inputs (cheap local checks before spending an API call)
             if not text or not text.strip():
-                return {'success': False, 'error': 'Empty text provided'}
+                return {'success': False, 'error': 'Empty text provided', 'type': 'ValidationError'}
             
-            if voice_name not in self.VOICES:
+            if len(text) > self.MAX_TEXT_CHARS:
+                return {'success': False, 'error': f'Text too long: {len(text)} chars (max: {self.MAX_TEXT_CHARS})', 'type': 'ValidationError'}
+            
+            if language_code not in self._LANG_CODES:
+                return {'success': False, 'error': f'Unsupported language: {language_code}', 'type': 'ValidationError'}
+            
+            temperature = self._clamp_temperature(temperature)
+            
+            if voice_name not in self._VOICE_NAMES:
                 logger.warning(f"Unknown voice '{voice_name}', using Kore")
                 voice_name = 'Kore'
             
             # Prepare text with style prompt (HIGH IMPACT - natural language control)
-            if style_prompt and style_prompt.strip():
-                # User provided style like "Say cheerfully:" or just "cheerfully"
-                if not style_prompt.lower().startswith('say '):
-                    style_prompt = f"Say {style_prompt}:"
+            # User provided style like "Say cheerfully:" or just "cheerfully"
+            style_prompt = style_prompt.strip() if style_prompt else ''
+            if not style_prompt:
+                full_text = text
+            elif style_prompt[:4].casefold() == 'say ':
                 full_text = f"{style_prompt} {text}"
             else:
-                full_text = text
+                full_text = f"Say {style_prompt}: {text}"
+            
+            # The style prompt is sent too, so the limit applies to the combined text
+            if len(full_text) > self.MAX_TEXT_CHARS:
+                return {'success': False, 'error': f'Text plus style prompt too long: {len(full_text)} chars (max: {self.MAX_TEXT_CHARS})', 'type': 'ValidationError'}
+            
+            # Serve repeat requests from the audio cache
+            if postprocess and not NUMPY_AVAILABLE:
+                logger.warning("NumPy not available, skipping audio post-processing")
+                postprocess = False
+            
+            cache_key = self._cache_key(text, voice_name, language_code, style_prompt, temperature, self.model_name, postprocess)
+            out_dir = self._resolve_output_dir(output_dir)
+            output_path = str(out_dir / f"tts_{next(self._seq):08d}_{voice_name}_{secrets.token_hex(3)}.wav")
+            if self._cache_fetch(cache_key, output_path):
+                logger.info(f"✓ Audio served from cache: voice={voice_name}, lang={language_code}")
+                return {
+                    'success': True,
+                    **self._describe_wav(output_path),
+                    'voice': voice_name,
+                    'language': language_code,
+                    'char_count': len(text),
+                    'style_prompt': style_prompt,
+                    'cached': True
+                }
             
             logger.info(f"🎤 Generating speech: {len(text)} chars, voice={voice_name}, lang={language_code}")
             
             # Use NEW Google Gen AI SDK with correct TTS format
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=full_text,
-                config=types.GenerateContentConfig(
+            response = self._generate_audio(
+                full_text,
+                self._types.GenerateContentConfig(
                     response_modalities=['AUDIO'],
-                    speech_config=types.SpeechConfig(
-                        voice_config=types.VoiceConfig(
-                            prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                                voice_name=voice_name
-                            )
-                        )
+                    speech_config=self._types.SpeechConfig(
+                        voice_config=self._voice_cfg(voice_name)
                     )
                 )
             )
             
-            # Debug: Check response structure
-            logger.info(f"Response received. Candidates: {len(response.candidates) if hasattr(response, 'candidates') else 'N/A'}")
-            if hasattr(response, 'prompt_feedback'):
-                logger.info(f"Prompt feedback: {response.prompt_feedback}")
+            # Debug: Check response structure (skipped entirely unless DEBUG is enabled)
+            debug = logger.isEnabledFor(logging.DEBUG)
+            if debug:
+                logger.debug(f"Response received. Candidates: {len(response.candidates) if hasattr(response, 'candidates') else 'N/A'}")
+                if hasattr(response, 'prompt_feedback'):
+                    logger.debug(f"Prompt feedback: {response.prompt_feedback}")
             
             # Check if we have candidates
             if not response.candidates or len(response.candidates) == 0:
@@ -209,36 +394,34 @@ class GeminiTTSService:
                 }
             
             # Debug candidate structure
-            candidate = response.candidates[0]
-            logger.info(f"Candidate content type: {type(candidate.content)}")
-            logger.info(f"Candidate has parts: {hasattr(candidate.content, 'parts')}")
-            if hasattr(candidate.content, 'parts'):
-                logger.info(f"Parts count: {len(candidate.content.parts)}")
-                if len(candidate.content.parts) > 0:
-                    logger.info(f"First part type: {type(candidate.content.parts[0])}")
-                    logger.info(f"First part has inline_data: {hasattr(candidate.content.parts[0], 'inline_data')}")
-            
-            # Extract audio data
-            audio_data = response.candidates[0].content.parts[0].inline_data.data
-            
-            # Save WAV file
-            if output_dir is None:
-                output_dir = os.path.join(os.path.dirname(__file__), 'outputs')
-            os.makedirs(output_dir, exist_ok=True)
-            
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"tts_{timestamp}_{voice_name}.wav"
-            output_path = os.path.join(output_dir, filename)
+            if debug:
+                candidate = response.candidates[0]
+                logger.debug(f"Candidate content type: {type(candidate.content)}")
+                logger.debug(f"Candidate has parts: {hasattr(candidate.content, 'parts')}")
+                if hasattr(candidate.content, 'parts'):
+                    logger.debug(f"Parts count: {len(candidate.content.parts)}")
+                    if len(candidate.content.parts) > 0:
+                        logger.debug(f"First part type: {type(candidate.content.parts[0])}")
+                        logger.debug(f"First part has inline_data: {hasattr(candidate.content.parts[0], 'inline_data')}")
+            
+            # Extract audio data (every inline_data part, in order)
+            audio_chunks, mime_type = self._audio_chunks(response)
+            if not audio_chunks:
+                logger.error("No audio data in response")
+                return {'success': False, 'error': 'No audio data in response'}
+            
+            if postprocess:
+                audio_chunks = [self._postprocess(b''.join(audio_chunks))]
             
             # Write WAV file (24kHz, 16-bit PCM, mono)
-            with wave.open(output_path, 'wb') as wf:
-                wf.setnchannels(1)      # Mono
-                wf.setsampwidth(2)      # 16-bit
-                wf.setframerate(24000)  # 24kHz
-                wf.writeframes(audio_data)
+            filename = os.path.basename(output_path)
+            sample_rate = self._pcm_sample_rate(mime_type)
+            pcm_bytes = self._io_pool.submit(self._write_wav, output_path, audio_chunks, sample_rate).result()
             
-            file_size = os.path.getsize(output_path)
-            duration = len(audio_data) / (24000 * 2)  # samples / (sample_rate * bytes_per_sample)
+            self._cache_store(cache_key, output_path)
+            
+            file_size = self.WAV_HEADER_SIZE + pcm_bytes
+            duration = pcm_bytes / (sample_rate * self._BYTES_PER_FRAME)
             
             logger.info(f"✓ Audio generated: {filename} ({file_size:,} bytes, {duration:.1f}s)")
             
@@ -251,20 +434,60 @@ class GeminiTTSService:
                 'voice': voice_name,
                 'language': language_code,
                 'char_count': len(text),
-                'style_prompt': style_prompt
+                'style_prompt': style_prompt,
+                'cached': False
             }
             
         except Exception as e:
-            logger.error(f"Error generating speech: {str(e)}")
-            logger.error(f"Exception type: {type(e).__name__}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.exception("Error generating speech: voice=%s lang=%s", voice_name, language_code)
             return {
                 'success': False,
                 'error': str(e),
                 'type': type(e).__name__
             }
     
+    async def generate_speech_batch(self, items: list, max_concurrency: int = 8) -> list:
+        """
+        Generate speech for many texts concurrently
+        
+        Args:
+            items: List of generate_speech keyword dicts
+                   Example: [{'text': 'Hello!', 'voice_name': 'Puck'}, {'text': 'Goodbye.'}]
+            max_concurrency: Maximum API calls in flight at once (default: 8)
+        
+        Returns:
+            list of result dicts, in the same order as items
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def _one(item):
+            async with semaphore:
+                return await self._generate_one_async(**item)
+        
+        logger.info(f"🎤 Generating speech batch: {len(items)} items, concurrency={max_concurrency}")
+        results = await asyncio.gather(*[_one(item) for item in items], return_exceptions=True)
+        
+        return [
+            result if not isinstance(result, BaseException) else {
+                'success': False,
+                'error': str(result),
+                'type': type(result).__name__
+            }
+            for result in results
+        ]
+    
+    def generate_speech_batch_sync(self, items: list, max_concurrency: int = 8) -> list:
+        """
+        Blocking wrapper around generate_speech_batch for non-async callers (e.g. Flask routes)
+        
+        Must not be called from inside a running event loop.
+        """
+        return asyncio.run(self.generate_speech_batch(items, max_concurrency=max_concurrency))
+    
+    async def _generate_one_async(self, **kwargs) -> dict:
+        """Run one generate_speech call on a worker thread so the event loop stays free"""
+        return await asyncio.to_thread(self.generate_speech, **kwargs)
+    
     def generate_dialog(
         self,
         speakers: list,
@@ -291,10 +514,37 @@ class GeminiTTSService:
         try:
             # Validate
             if len(speakers) > 2:
-                return {'success': False, 'error': 'Maximum 2 speakers supported'}
+                return {'success': False, 'error': 'Maximum 2 speakers supported', 'type': 'ValidationError'}
             
             if not transcript or not transcript.strip():
-                return {'success': False, 'error': 'Empty transcript'}
+                return {'success': False, 'error': 'Empty transcript', 'type': 'ValidationError'}
+            
+            if len(transcript) > self.MAX_TEXT_CHARS:
+                return {'success': False, 'error': f'Transcript too long: {len(transcript)} chars (max: {self.MAX_TEXT_CHARS})', 'type': 'ValidationError'}
+            
+            if language_code not in self._LANG_CODES:
+                return {'success': False, 'error': f'Unsupported language: {language_code}', 'type': 'ValidationError'}
+            
+            temperature = self._clamp_temperature(temperature)
+            
+            # Serve repeat dialogs from the audio cache
+            speaker_pairs = sorted(
+                f"{speaker.get('name', '')}={speaker.get('voice', 'Kore')}" for speaker in speakers
+            )
+            cache_key = self._cache_key(transcript, ','.join(speaker_pairs), language_code, temperature, self.model_name)
+            out_dir = self._resolve_output_dir(output_dir)
+            output_path = str(out_dir / f"tts_dialog_{next(self._seq):08d}_{secrets.token_hex(3)}.wav")
+            if self._cache_fetch(cache_key, output_path):
+                logger.info(f"✓ Dialog served from cache: {len(speakers)} speakers")
+                return {
+                    'success': True,
+                    **self._describe_wav(output_path),
+                    'speakers': [s.get('name') for s in speakers],
+                    'voices': [s.get('voice') for s in speakers],
+                    'language': language_code,
+                    'char_count': len(transcript),
+                    'cached': True
+                }
             
             logger.info(f"🎭 Generating dialog: {len(speakers)} speakers, {len(transcript)} chars")
             
@@ -302,28 +552,23 @@ class GeminiTTSService:
             speaker_voice_configs = []
             for speaker in speakers:
                 voice_name = speaker.get('voice', 'Kore')
-                if voice_name not in self.VOICES:
+                if voice_name not in self._VOICE_NAMES:
                     voice_name = 'Kore'
                 
                 speaker_voice_configs.append(
-                    types.SpeakerVoiceConfig(
+                    self._types.SpeakerVoiceConfig(
                         speaker=speaker.get('name', f"Speaker{len(speaker_voice_configs)+1}"),
-                        voice_config=types.VoiceConfig(
-                            prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                                voice_name=voice_name
-                            )
-                        )
+                        voice_config=self._voice_cfg(voice_name)
                     )
                 )
             
             # Use NEW Google Gen AI SDK for dialog
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=transcript,
-                config=types.GenerateContentConfig(
+            response = self._generate_audio(
+                transcript,
+                self._types.GenerateContentConfig(
                     response_modalities=['AUDIO'],
-                    speech_config=types.SpeechConfig(
-                        multi_speaker_voice_config=types.MultiSpeakerVoiceConfig(
+                    speech_config=self._types.SpeechConfig(
+                        multi_speaker_voice_config=self._types.MultiSpeakerVoiceConfig(
                             speaker_voice_configs=speaker_voice_configs
                         )
                     )
@@ -331,24 +576,19 @@ class GeminiTTSService:
             )
             
             # Extract and save audio
-            audio_data = response.candidates[0].content.parts[0].inline_data.data
+            audio_chunks, mime_type = self._audio_chunks(response)
+            if not audio_chunks:
+                logger.error("No audio data in dialog response")
+                return {'success': False, 'error': 'No audio data in response'}
             
-            if output_dir is None:
-                output_dir = os.path.join(os.path.dirname(__file__), 'outputs')
-            os.makedirs(output_dir, exist_ok=True)
+            filename = os.path.basename(output_path)
+            sample_rate = self._pcm_sample_rate(mime_type)
+            pcm_bytes = self._io_pool.submit(self._write_wav, output_path, audio_chunks, sample_rate).result()
             
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"tts_dialog_{timestamp}.wav"
-            output_path = os.path.join(output_dir, filename)
+            self._cache_store(cache_key, output_path)
             
-            with wave.open(output_path, 'wb') as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(2)
-                wf.setframerate(24000)
-                wf.writeframes(audio_data)
-            
-            file_size = os.path.getsize(output_path)
-            duration = len(audio_data) / (24000 * 2)
+            file_size = self.WAV_HEADER_SIZE + pcm_bytes
+            duration = pcm_bytes / (sample_rate * self._BYTES_PER_FRAME)
             
             logger.info(f"✓ Dialog generated: {filename} ({file_size:,} bytes, {duration:.1f}s)")
             
@@ -361,46 +601,243 @@ class GeminiTTSService:
                 'speakers': [s.get('name') for s in speakers],
                 'voices': [s.get('voice') for s in speakers],
                 'language': language_code,
-                'char_count': len(transcript)
+                'char_count': len(transcript),
+                'cached': False
             }
             
         except Exception as e:
-            logger.error(f"Error generating dialog: {str(e)}")
+            logger.exception("Error generating dialog: %d speakers, lang=%s", len(speakers), language_code)
             return {
                 'success': False,
                 'error': str(e),
                 'type': type(e).__name__
             }
     
-    def get_voices_catalog(self) -> dict:
+    def _voice_cfg(self, voice_name: str):
+        """Shared VoiceConfig per voice (validated names only, so the cache stays small)"""
+        cfg = self._voice_cfgs.get(voice_name)
+        if cfg is None:
+            cfg = self._voice_cfgs[voice_name] = self._types.VoiceConfig(
+                prebuilt_voice_config=self._types.PrebuiltVoiceConfig(voice_name=voice_name))
+        return cfg
+    
+    @classmethod
+    def _clamp_temperature(cls, temperature) -> float:
+        """Coerce temperature into the supported 0.0-2.0 range (default on bad input)"""
+        try:
+            return max(0.0, min(2.0, float(temperature)))
+        except (TypeError, ValueError):
+            return cls.DEFAULT_TEMPERATURE
+    
+    def _generate_audio(self, contents: str, config):
         """
-        Get complete voice catalog with categories
+        Rate-limited generate_content call
+        
+        Blocks on the RPM/TPM buckets before every attempt (~4 chars per token)
+        and retries 429s with exponential backoff.
+        """
+        def _request():
+            self._rpm_bucket.acquire()
+            self._tpm_bucket.acquire(len(contents) // 4)
+            return self.client.models.generate_content(
+                model=self.model_name,
+                contents=contents,
+                config=config
+            )
+        
+        return call_with_backoff(_request, label='Gemini TTS')
+    
+    @staticmethod
+    def _audio_chunks(response) -> tuple:
+        """
+        Collect the PCM payload of every inline_data part without concatenating them
+        
+        Returns:
+            tuple: (list of byte chunks, MIME type of the first audio part or None)
+        """
+        if not response.candidates or not response.candidates[0].content:
+            return [], None
+        parts = [
+            part for part in (response.candidates[0].content.parts or [])
+            if getattr(part, 'inline_data', None) and part.inline_data.data
+        ]
+        if not parts:
+            return [], None
+        return [part.inline_data.data for part in parts], parts[0].inline_data.mime_type
+    
+    @classmethod
+    def _pcm_sample_rate(cls, mime_type: str) -> int:
+        """
+        Parse the sample rate from a PCM MIME type such as 'audio/L16;codec=pcm;rate=24000'
+        
+        Raises:
+            ValueError: If the payload is not raw PCM (it could not be wrapped as WAV)
+        """
+        if not mime_type:
+            return cls.SAMPLE_RATE
+        
+        media_type, *params = mime_type.split(';')
+        if media_type.strip().lower() not in cls._PCM_MIME_TYPES:
+            raise ValueError(f"Unsupported audio format from Gemini: {mime_type}")
+        
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'rate' and value.strip().isdigit():
+                return int(value)
+        return cls.SAMPLE_RATE
+    
+    @classmethod
+    def _postprocess(cls, pcm: bytes) -> bytes:
+        """
+        Trim leading/trailing silence and peak-normalize 16-bit PCM
+        
+        Works on a zero-copy int16 view with vectorized NumPy ops, so a 30s clip
+        (~720k samples) takes about a millisecond.
+        """
+        pcm = pcm[:len(pcm) & ~1]  # Drop a stray trailing byte (frombuffer needs whole samples)
+        samples = np.frombuffer(pcm, dtype='<i2')
+        if samples.size == 0:
+            return pcm
+        
+        # Trim silence (keep the audio untouched if it is silent throughout)
+        loud = np.abs(samples.astype(np.int32)) > cls.SILENCE_THRESHOLD
+        if not loud.any():
+            return pcm
+        start = int(loud.argmax())
+        end = len(samples) - int(loud[::-1].argmax())
+        samples = samples[start:end]
+        
+        # Peak-normalize (int32 math avoids int16 overflow on abs/multiply)
+        wide = samples.astype(np.int32)
+        peak = int(np.abs(wide).max())
+        if peak:
+            samples = (wide * cls.NORMALIZE_PEAK // peak).astype('<i2')
         
-        Returns organized voice list for frontend
+        return samples.tobytes()
+    
+    @classmethod
+    def _wav_header(cls, data_len: int, sample_rate: int) -> bytes:
+        """Build the canonical 44-byte PCM WAV header for data_len bytes of audio"""
+        return _WAV_HEADER.pack(
+            b'RIFF', 36 + data_len, b'WAVE',
+            b'fmt ', 16, 1, cls.CHANNELS, sample_rate,
+            sample_rate * cls._BYTES_PER_FRAME, cls._BYTES_PER_FRAME, cls.SAMPLE_WIDTH * 8,
+            b'data', data_len
+        )
+    
+    @classmethod
+    def _write_wav(cls, output_path: str, audio_chunks, sample_rate: int = SAMPLE_RATE) -> int:
         """
-        categorized = {}
-        for voice_name, voice_info in self.VOICES.items():
-            voice_type = voice_info['type']
-            if voice_type not in categorized:
-                categorized[voice_type] = []
-            
-            categorized[voice_type].append({
-                'name': voice_name,
-                'gender': voice_info['gender'],
-                'trait': voice_info['trait'],
-                'best_for': voice_info['best_for'],
-                'type': voice_type
-            })
+        Write PCM chunks into a WAV file (16-bit PCM, mono)
+        
+        The chunk sizes are known up front, so the header is packed directly and
+        header + chunks go out in a single writev call (no `wave` module, and the
+        payload is never joined into one buffer).
+        
+        Returns:
+            int: Number of PCM bytes written
+        """
+        data_len = sum(len(chunk) for chunk in audio_chunks)
+        buffers = [cls._wav_header(data_len, sample_rate), *audio_chunks]
+        
+        fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            _write_all(fd, buffers)
+        finally:
+            os.close(fd)
+        return data_len
+    
+    def _resolve_output_dir(self, output_dir: str) -> Path:
+        """Return the output directory, creating it only the first time it is seen"""
+        if output_dir is None:
+            return self._default_output_dir
         
+        out_dir = Path(output_dir)
+        if out_dir not in self._seen_output_dirs:
+            out_dir.mkdir(parents=True, exist_ok=True)
+            self._seen_output_dirs.add(out_dir)
+        return out_dir
+    
+    @staticmethod
+    def _cache_key(*parts) -> str:
+        """SHA-256 over the '|'-joined synthesis inputs"""
+        return hashlib.sha256('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    
+    def _cache_path(self, key: str) -> Path:
+        return self._audio_cache_dir / f"{key}.wav"
+    
+    def _cache_fetch(self, key: str, output_path: str) -> bool:
+        """
+        Materialize a cached WAV at output_path.
+        
+        Uses a hard link (zero-copy) when possible, falling back to a file copy.
+        Returns False on a cache miss or if the entry vanished mid-lookup.
+        """
+        cached_path = self._cache_path(key)
+        if not cached_path.exists():
+            return False
+        
+        try:
+            try:
+                os.link(cached_path, output_path)
+            except OSError:
+                shutil.copyfile(cached_path, output_path)
+            return True
+        except OSError as e:
+            logger.warning(f"Audio cache read failed for {key[:12]}: {e}")
+            return False
+    
+    def _cache_store(self, key: str, audio_path: str):
+        """
+        Add a freshly generated WAV to the cache atomically (tmp + os.replace).
+        
+        Hard-links the output file (no second write), falling back to a copy
+        when the cache lives on another filesystem.
+        """
+        tmp_path = self._audio_cache_dir / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            try:
+                os.link(audio_path, tmp_path)
+            except OSError:
+                shutil.copyfile(audio_path, tmp_path)
+            os.replace(tmp_path, self._cache_path(key))
+        except OSError as e:
+            logger.warning(f"Audio cache write failed for {key[:12]}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        
+        if next(self._cache_stores) % self.AUDIO_CACHE_PRUNE_EVERY == 0:
+            self._prune_audio_cache()
+    
+    def _prune_audio_cache(self):
+        """Delete expired WAVs and evict the oldest beyond AUDIO_CACHE_MAX_BYTES"""
+        removed = prune_cache_dir(self._audio_cache_dir, self.AUDIO_CACHE_TTL,
+                                  max_bytes=self.AUDIO_CACHE_MAX_BYTES)
+        if removed:
+            logger.info(f"🧹 Audio cache: removed {removed} expired/excess entries")
+    
+    @staticmethod
+    def _describe_wav(audio_path: str) -> dict:
+        """Build the path/size/duration fields of a result dict from a WAV on disk"""
+        with wave.open(audio_path, 'rb') as wf:
+            duration = wf.getnframes() / wf.getframerate()
         return {
-            'total_voices': len(self.VOICES),
-            'categories': categorized,
-            'voice_types': list(categorized.keys())
+            'audio_path': audio_path,
+            'filename': os.path.basename(audio_path),
+            'file_size': os.path.getsize(audio_path),
+            'duration': duration
         }
     
+    def get_voices_catalog(self) -> dict:
+        """
+        Get complete voice catalog with categories
+        
+        Returns organized voice list for frontend (prebuilt once at import, shared read-only)
+        """
+        return self._VOICES_CATALOG
+    
     def get_languages(self) -> dict:
-        """Get supported languages"""
-        return {
-            'total': len(self.LANGUAGES),
-            'languages': self.LANGUAGES
-        }
+        """Get supported languages (prebuilt once at import, shared read-only)"""
+        return self._LANGUAGES_CATALOG
@@ -0,0 +1,137 @@
+"""
+PDF Page Rendering Helpers
+Rasterizes PDF pages with PyMuPDF, in-process or on a shared render process pool
+
+Kept free of the Gemini SDKs (and anything else that starts threads or gRPC
+channels) so render worker processes stay small and fork-safe.
+
+Features:
+- Grayscale rendering straight to raw pixel bytes
+- Blank-page detection (page content first, low-res thumbnail only for scans)
+- One long-lived, process-wide render pool (forkserver where available, else spawn)
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageStat
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+logger = logging.getLogger(__name__)
+
+
+# Pixel-based blank check, only used for pages with no text or vector content
+# (scans), on a grayscale thumbnail (~300x420 px for A4/Letter). Deliberately
+# conservative: a lone "Total: 5" is ~0.05% ink at this size.
+BLANK_THUMB_ZOOM = 0.5
+BLANK_INK_RATIO = 0.0002  # Pages with less than 0.02% non-white pixels...
+BLANK_STDDEV = 1.0  # ...or a near-uniform tone (scanned separators) are blank
+_INK_LEVELS = bytes(range(250))  # Gray levels counted as ink
+
+# Render processes shared by every conversion in this server process
+RENDER_POOL_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def is_blank_page(thumb):
+    """True when an 8-bit grayscale thumbnail shows (almost) no content."""
+    samples = thumb.tobytes()
+    ink = len(samples) - len(samples.translate(None, _INK_LEVELS))
+    return ink < BLANK_INK_RATIO * len(samples) or ImageStat.Stat(thumb).stddev[0] < BLANK_STDDEV
+
+
+def _page_is_blank(page):
+    """
+    True when a page has nothing to extract.
+
+    Any text or vector drawing (however small) counts as content. Pages made
+    only of images (scans) fall back to the thumbnail pixel check.
+    """
+    if page.get_text().strip() or page.get_drawings():
+        return False
+    if not page.get_images():
+        return True
+    thumb = page.get_pixmap(matrix=fitz.Matrix(BLANK_THUMB_ZOOM, BLANK_THUMB_ZOOM),
+                            colorspace=fitz.csGRAY, alpha=False)
+    return is_blank_page(Image.frombytes("L", (thumb.width, thumb.height), thumb.samples))
+
+
+def render_page(doc, page_num, zoom, skip_blank=False):
+    """
+    Render one page of an open PyMuPDF document (72 DPI * zoom) in grayscale.
+
+    Color carries no information for table extraction, and a single gray
+    channel is a third of the RGB pixmap size.
+
+    Returns:
+        tuple: (width, height, samples) raw 8-bit grayscale pixmap data,
+            or None when skip_blank is set and the page is blank
+    """
+    page = doc[page_num]
+    if skip_blank and _page_is_blank(page):
+        return None
+
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    return pix.width, pix.height, pix.samples
+
+
+def render_pages_worker(pdf_path, page_nums, zoom, skip_blank=False):
+    """
+    Process-pool entry point: render a run of pages with `render_page`.
+
+    The PDF is opened once per task and closed before returning, so no worker
+    keeps an upload open (or locked, on Windows) once its pages are done.
+
+    Returns:
+        list: One `render_page` result per page in page_nums
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        return [render_page(doc, page_num, zoom, skip_blank) for page_num in page_nums]
+    finally:
+        doc.close()
+        fitz.TOOLS.store_shrink(100)  # Drop MuPDF's cached fonts/images for this PDF
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """
+    Get the process-wide render pool, creating it on first use.
+
+    Workers are started via forkserver (spawn on platforms without it), never
+    by forking this multi-threaded server process. Besides the entry script
+    (app.py imports its SDKs lazily) they only import this module.
+    """
+    global _render_pool
+
+    if _render_pool is None:
+        with _render_pool_lock:
+            if _render_pool is None:
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    ctx = multiprocessing.get_context('forkserver')
+                    ctx.set_forkserver_preload([__name__])
+                else:
+                    ctx = multiprocessing.get_context('spawn')
+                _render_pool = ProcessPoolExecutor(max_workers=RENDER_POOL_WORKERS, mp_context=ctx)
+                logger.info(f"🖨️  Render pool started ({RENDER_POOL_WORKERS} processes, {ctx.get_start_method()})")
+
+    return _render_pool
+
+
+def discard_render_pool(pool):
+    """Drop a broken pool (e.g. a worker crashed) so the next call starts a fresh one."""
+    global _render_pool
+
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
@@ -7,7 +7,7 @@ Max 25 pages per PDF with PARALLEL API calls for maximum speed
 Features:
 - PDF page extraction (converts each page to image)
 - PARALLEL Gemini API calls (all pages processed simultaneously)
-- Rate limiting (250 RPM, 1M TPM for Tier 1)
+- Rate limiting (250 RPM, 1M TPM for Tier 1) via shared token buckets
 - Multi-sheet Excel generation (1 sheet per page)
 - Progress tracking for frontend
 - Comprehensive error handling
@@ -18,12 +18,24 @@ Features:
 import google.generativeai as genai
 from PIL import Image
 import json
+import hashlib
+import io
 import os
 import logging
 import time
+import threading
+from dataclasses import dataclass, field
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from itertools import count, repeat
+
+from rate_limiter import TokenBucket, call_with_backoff, is_transient_error
+from disk_cache import prune_cache_dir
+from pdf_render import (BLANK_THUMB_ZOOM, RENDER_POOL_WORKERS, discard_render_pool, get_render_pool,
+                        is_blank_page, render_page, render_pages_worker)
 
 # PDF processing imports
 try:
@@ -43,9 +55,44 @@ except ImportError:
 if not PYMUPDF_AVAILABLE and not PDF2IMAGE_AVAILABLE:
     raise ImportError("Neither PyMuPDF nor pdf2image is available. Install at least one: pip install PyMuPDF or pip install pdf2image")
 
+# Optional fast JSON parser (orjson.JSONDecodeError subclasses json.JSONDecodeError)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
 
+@dataclass(slots=True)
+class PageResult:
+    """
+    Outcome of extracting tables from one PDF page.
+    
+    Used internally while pages are processed; converted with `to_dict()`
+    only where results leave the extractor (process_pdf's return value).
+    """
+    page_number: int
+    success: bool
+    tables: list = field(default_factory=list)
+    error: str | None = None
+    metadata: dict | None = None
+    
+    def to_dict(self):
+        """Plain dict in the shape API consumers expect (error/metadata only when set)."""
+        result = {
+            'success': self.success,
+            'page_number': self.page_number,
+            'tables': self.tables
+        }
+        if self.metadata is not None:
+            result['metadata'] = self.metadata
+        if self.error is not None:
+            result['error'] = self.error
+        return result
+
+
 class PDFToExcelExtractor:
     """
     Extract tables from multi-page PDF and convert to Excel.
@@ -53,27 +100,110 @@ class PDFToExcelExtractor:
     
     Production Configuration:
     - Max 25 pages per PDF
-    - Sequential processing (1 page = 1 API call)
+    - Parallel processing (1 page = 1 API call, up to 10 in flight)
     - Rate limiting: 250 RPM (Tier 1)
-    - Model: gemini-2.5-flash
+    - Model: gemini-2.5-flash-lite, falling back to gemini-2.5-flash
     - Cost: ~$0.03 per page
     
+    Create one instance and reuse it process-wide: it owns the shared rate
+    limiters and the warmed-up gRPC channel to Gemini.
+    
     Workflow:
     1. Validate PDF (page count ≤ 25)
-    2. Extract each page as image
-    3. Call Gemini API for each page sequentially
+    2. Render each page as an in-memory image
+    3. Call Gemini API for each page as soon as it is rendered (pipelined)
     4. Generate Excel with multiple sheets (1 per page)
-    5. Clean up temporary files
     """
     
     # Production limits
     MAX_PAGES = 25  # Maximum pages per PDF
+    MIN_PDF_BYTES = 1024  # Anything smaller can't hold a page with a table; rejected without opening
     RPM_LIMIT = 250  # Tier 1 rate limit (requests per minute)
     TPM_LIMIT = 1000000  # Tier 1 TPM limit (1M tokens per minute)
+    MAX_CONCURRENT_GEMINI = 10  # In-flight Gemini requests across all conversions
+    PROGRESS_INTERVAL = 0.2  # Min seconds between per-page progress callbacks
+    PROCESS_RENDER_MIN_PAGES = 4  # Smaller PDFs render in-process (pool startup costs more than it saves)
+    PAGE_CACHE_TTL = 86400  # Seconds a cached page result stays valid (older entries are deleted)
+    PAGE_CACHE_MAX_ENTRIES = 5000  # Oldest entries evicted beyond this
+    PAGE_CACHE_PRUNE_EVERY = 200  # Re-run the expiry sweep after this many stores
+    FAST_MODEL = 'gemini-2.5-flash-lite'  # First pass for every page
+    ACCURATE_MODEL = 'gemini-2.5-flash'  # Fallback when the first pass finds nothing usable
+    RENDER_ZOOM = 2.0  # 144 DPI (72 * 2): ample for table OCR, ~2.25x fewer pixels than 3.0
+    JPEG_QUALITY = 85  # Upload encoding: far smaller than PNG, no accuracy loss on tables
     # Removed DELAY_BETWEEN_CALLS - Using parallel processing with 1M TPM headroom
     
-    def __init__(self):
-        """Initialize Gemini model and PDF processor"""
+    # Page extraction prompt, built once and shared by every page request
+    _EXTRACTION_PROMPT = """You are an EXPERT TABLE EXTRACTION system. Extract ALL tables from this PDF page with PERFECT accuracy.
+
+📋 INSTRUCTIONS:
+
+1. **IDENTIFY ALL TABLES:**
+   - Detect tables with visible borders
+   - Detect borderless tables (aligned columns)
+   - Include all tabular data on the page
+
+2. **EXTRACT STRUCTURE:**
+   - Count exact rows and columns
+   - Identify header rows
+   - Handle merged cells (put text in first cell)
+
+3. **EXTRACT CONTENT:**
+   - Read each cell exactly as shown
+   - Preserve numbers precisely (2250 not 2200)
+   - Keep formatting (currency symbols, decimals)
+   - Empty cells: "" (empty string)
+
+4. **OUTPUT FORMAT (STRICT JSON):**
+```json
+{
+  "page_number": <page number from image filename or 1>,
+  "tables_found": <number of tables on this page>,
+  "tables": [
+    {
+      "table_id": <1, 2, 3... if multiple tables>,
+      "metadata": {
+        "total_rows": <row count>,
+        "total_columns": <column count>,
+        "has_headers": true|false
+      },
+      "headers": ["Column1", "Column2", ...],
+      "data": [
+        ["row1_col1", "row1_col2", ...],
+        ["row2_col1", "row2_col2", ...],
+        ...
+      ]
+    }
+  ],
+  "extraction_notes": "Brief quality notes"
+}
+```
+
+✅ QUALITY REQUIREMENTS:
+☑ All tables on page extracted
+☑ Exact cell values (no approximation)
+☑ Correct row/column counts
+☑ Headers properly identified
+☑ Empty cells marked as ""
+
+🚀 BEGIN EXTRACTION:"""
+    
+    # Mixed into every page cache key: changing a model or the prompt invalidates old entries
+    _PAGE_CACHE_SALT = '|'.join((
+        FAST_MODEL,
+        ACCURATE_MODEL,
+        hashlib.blake2b(_EXTRACTION_PROMPT.encode('utf-8'), digest_size=8).hexdigest()
+    )).encode('utf-8')
+    
+    def __init__(self, render_zoom=None):
+        """
+        Initialize Gemini model and PDF processor
+        
+        Args:
+            render_zoom (float, optional): Page render zoom (default: RENDER_ZOOM);
+                use 3.0 for accuracy-critical PDFs with tiny print
+        """
+        self.render_zoom = render_zoom or self.RENDER_ZOOM
+        
         # Get API key from environment
         self.api_key = os.getenv('GEMINI_API_KEY')
         if not self.api_key:
@@ -83,8 +213,8 @@ class PDFToExcelExtractor:
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY environment variable is required")
         
-        # Configure Gemini
-        genai.configure(api_key=self.api_key)
+        # Configure Gemini (gRPC: one HTTP/2 channel multiplexes all parallel page calls)
+        genai.configure(api_key=self.api_key, transport='grpc')
         
         # Initialize model with optimized generation config
         self.generation_config = {
@@ -94,19 +224,51 @@ class PDFToExcelExtractor:
             "max_output_tokens": 8192,  # Conservative, can increase to 65536 if needed
         }
         
-        self.model = genai.GenerativeModel(
-            'gemini-2.5-flash',
+        # Two tiers: flash-lite handles simple pages cheaply, flash takes the pages it can't
+        self.model_fast = genai.GenerativeModel(
+            self.FAST_MODEL,
+            generation_config=self.generation_config
+        )
+        self.model_accurate = genai.GenerativeModel(
+            self.ACCURATE_MODEL,
             generation_config=self.generation_config
         )
         
-        # Track API call timing for rate limiting
-        self.last_api_call_time = 0
-        self.api_call_count = 0
-        self.api_call_window_start = time.time()
+        # Token buckets shared by all worker threads: every Gemini call waits for
+        # RPM and (estimated) TPM capacity. Burst = one full PDF so a single
+        # conversion dispatches immediately; sustained load is smoothed to the limit.
+        self.rpm_bucket = TokenBucket(self.RPM_LIMIT, burst=self.MAX_PAGES)
+        self.tpm_bucket = TokenBucket(self.TPM_LIMIT)
+        # Caps in-flight requests even when several PDFs are converting at once
+        self.gemini_slots = threading.BoundedSemaphore(self.MAX_CONCURRENT_GEMINI)
         
-        logger.info(f"✓ PDF-to-Excel Extractor initialized (gemini-2.5-flash)")
+        # Per-page results keyed by rendered image content, so re-running a PDF is free
+        self._page_cache_dir = Path(__file__).parent / 'page_cache'
+        self._page_cache_dir.mkdir(parents=True, exist_ok=True)
+        self._page_cache_stores = count(1)
+        self._prune_page_cache()
+        
+        # Retried Gemini calls and pages answered per model tier since startup (for logging)
+        self.retry_count = 0
+        self.tier_usage = {'fast': 0, 'accurate': 0}
+        self._stats_lock = threading.Lock()
+        
+        logger.info(f"✓ PDF-to-Excel Extractor initialized ({self.FAST_MODEL} → {self.ACCURATE_MODEL})")
         logger.info(f"✓ PDF processor: {'PyMuPDF' if PYMUPDF_AVAILABLE else 'pdf2image'}")
-        logger.info(f"✓ Max pages: {self.MAX_PAGES}, Rate limit: {self.RPM_LIMIT} RPM")
+        logger.info(f"✓ Max pages: {self.MAX_PAGES}, Rate limit: {self.RPM_LIMIT} RPM, "
+                    f"Concurrency: {self.MAX_CONCURRENT_GEMINI}, Render zoom: {self.render_zoom}")
+        
+        # Open the channel (DNS, TLS, auth) in the background so the first PDF's
+        # burst of page calls doesn't pay the handshake on the critical path
+        threading.Thread(target=self._warm_up, name='gemini-warmup', daemon=True).start()
+    
+    def _warm_up(self):
+        """Best-effort count_tokens call to establish the Gemini connection."""
+        try:
+            self.model_fast.count_tokens("warmup")
+            logger.info("✓ Gemini connection warmed up")
+        except Exception as e:
+            logger.warning(f"Gemini warm-up failed (first request will connect instead): {e}")
     
     def get_pdf_page_count(self, pdf_path):
         """
@@ -119,21 +281,31 @@ class PDFToExcelExtractor:
             int: Number of pages
         """
         try:
-            if PYMUPDF_AVAILABLE:
-                doc = fitz.open(pdf_path)
-                page_count = len(doc)
-                doc.close()
-                return page_count
-            elif PDF2IMAGE_AVAILABLE:
-                from pdf2image import pdfinfo_from_path
-                info = pdfinfo_from_path(pdf_path)
-                return info.get('Pages', 0)
-            else:
-                raise RuntimeError("No PDF processing library available")
+            stat = os.stat(pdf_path)
+            return self._probe_pdf(os.path.realpath(pdf_path), stat.st_mtime_ns, stat.st_size)
         except Exception as e:
             logger.error(f"Error getting PDF page count: {e}")
             raise
     
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _probe_pdf(path, mtime_ns, size):
+        """
+        Open a PDF just long enough to count its pages.
+        
+        Cached on (path, mtime, size) so validation and rendering of the same
+        file - or a re-upload of an unchanged file - only parse it once.
+        """
+        if PYMUPDF_AVAILABLE:
+            with fitz.open(path) as doc:
+                return doc.page_count
+        elif PDF2IMAGE_AVAILABLE:
+            from pdf2image import pdfinfo_from_path
+            info = pdfinfo_from_path(path)
+            return info.get('Pages', 0)
+        else:
+            raise RuntimeError("No PDF processing library available")
+    
     def validate_pdf(self, pdf_path):
         """
         Validate PDF file for processing.
@@ -168,7 +340,14 @@ class PDFToExcelExtractor:
                     'error': f'PDF file too large: {file_size / (1024*1024):.1f}MB (max: 100MB)'
                 }
             
-            # Get page count
+            if file_size < self.MIN_PDF_BYTES:
+                return {
+                    'valid': False,
+                    'page_count': 0,
+                    'error': f'PDF file too small to contain any tables: {file_size} bytes'
+                }
+            
+            # Get page count (reads the page tree's /Count; no page objects are loaded)
             page_count = self.get_pdf_page_count(pdf_path)
             
             # Check page count limit
@@ -202,236 +381,336 @@ class PDFToExcelExtractor:
                 'error': f'PDF validation failed: {str(e)}'
             }
     
-    def extract_pages_as_images(self, pdf_path, output_dir):
+    def iter_page_images(self, pdf_path, skip_blank=False):
         """
-        Extract each PDF page as a separate image.
+        Render PDF pages to in-memory PIL images, yielding each one as soon as it is ready.
+        
+        Pages go straight from the PyMuPDF pixmap buffer into PIL, with no PNG
+        encode/write/read/decode round-trip through the filesystem.
         
         Args:
             pdf_path (str): Path to PDF file
-            output_dir (str): Directory to save page images
+            skip_blank (bool): Yield None instead of rendering pages that are blank
+                (no text, drawings or images; scans get a low-res pixel check)
+        
+        Yields:
+            tuple: (page_number, PIL.Image or None), 1-indexed, in page order
+        """
+        if PYMUPDF_AVAILABLE:
+            # Use PyMuPDF (faster, more reliable)
+            logger.info("Rendering PDF pages with PyMuPDF...")
+            page_count = self.get_pdf_page_count(pdf_path)
+            workers = min(page_count, RENDER_POOL_WORKERS) if page_count >= self.PROCESS_RENDER_MIN_PAGES else 1
+            
+            if workers > 1:
+                # MuPDF is not thread-safe and holds the GIL while rasterizing,
+                # so spread pages across the shared render processes; only raw
+                # pixel bytes come back. Pages go out in short runs (~2 per
+                # worker) so each task opens the PDF once and closes it again.
+                chunk = max(1, page_count // (workers * 2))
+                runs = [range(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+                pool = get_render_pool()
+                try:
+                    rendered = pool.map(render_pages_worker, repeat(pdf_path), runs,
+                                        repeat(self.render_zoom), repeat(skip_blank))
+                    page_num = 0
+                    for run in rendered:
+                        for pixels in run:
+                            page_num += 1
+                            yield page_num, self._pixels_to_image(pixels)
+                except BrokenProcessPool:
+                    discard_render_pool(pool)
+                    raise
+            else:
+                doc = fitz.open(pdf_path)
+                try:
+                    for page_num in range(page_count):
+                        pixels = render_page(doc, page_num, self.render_zoom, skip_blank)
+                        yield page_num + 1, self._pixels_to_image(pixels)
+                finally:
+                    doc.close()
+                    fitz.TOOLS.store_shrink(100)  # Drop MuPDF's cached fonts/images for this PDF
+            
+            logger.info(f"  ✓ Rendered {page_count} pages ({workers} worker{'s' if workers > 1 else ''})")
+            
+        elif PDF2IMAGE_AVAILABLE:
+            # Use pdf2image (requires poppler)
+            logger.info("Rendering PDF pages with pdf2image...")
+            images = convert_from_path(pdf_path, dpi=int(72 * self.render_zoom), grayscale=True,
+                                       thread_count=os.cpu_count() or 1)
+            
+            logger.info(f"  ✓ Rendered {len(images)} pages")
+            thumb_factor = max(1, round(self.render_zoom / BLANK_THUMB_ZOOM))
+            for page_num, img in enumerate(images, 1):
+                if skip_blank and is_blank_page(img.reduce(thumb_factor)):
+                    img = None
+                yield page_num, img
+        
+        else:
+            raise RuntimeError("No PDF processing library available")
+    
+    def _pixels_to_image(self, pixels):
+        """Wrap raw gray samples from `render_page` directly (no PNG encode/decode); None stays None."""
+        if pixels is None:
+            return None
+        width, height, samples = pixels
+        return Image.frombytes("L", (width, height), samples)
+    
+    def extract_pages_as_images(self, pdf_path, output_dir=None, save_to_disk=False):
+        """
+        Render every PDF page to an in-memory PIL image.
+        
+        Args:
+            pdf_path (str): Path to PDF file
+            output_dir (str, optional): Directory for debug PNG copies
+            save_to_disk (bool): Also save each page as PNG in output_dir (debugging)
         
         Returns:
-            list: List of image file paths for each page
+            list: PIL.Image for each page, in page order
         """
         try:
-            os.makedirs(output_dir, exist_ok=True)
-            image_paths = []
-            
-            if PYMUPDF_AVAILABLE:
-                # Use PyMuPDF (faster, more reliable)
-                logger.info("Extracting PDF pages with PyMuPDF...")
-                doc = fitz.open(pdf_path)
-                
-                for page_num in range(len(doc)):
-                    page = doc[page_num]
-                    
-                    # Render page to image (high quality: 300 DPI)
-                    zoom = 3.0  # 300 DPI (72 * 3 = 216, close to 300)
-                    mat = fitz.Matrix(zoom, zoom)
-                    pix = page.get_pixmap(matrix=mat, alpha=False)
-                    
-                    # Save as PNG
-                    image_path = os.path.join(output_dir, f"page_{page_num + 1:03d}.png")
-                    pix.save(image_path)
-                    image_paths.append(image_path)
-                    
-                    logger.info(f"  ✓ Extracted page {page_num + 1}/{len(doc)}: {os.path.basename(image_path)}")
-                
-                doc.close()
-                
-            elif PDF2IMAGE_AVAILABLE:
-                # Use pdf2image (requires poppler)
-                logger.info("Extracting PDF pages with pdf2image...")
-                images = convert_from_path(pdf_path, dpi=300, fmt='png')
-                
-                for page_num, image in enumerate(images):
-                    image_path = os.path.join(output_dir, f"page_{page_num + 1:03d}.png")
-                    image.save(image_path, 'PNG')
-                    image_paths.append(image_path)
-                    
-                    logger.info(f"  ✓ Extracted page {page_num + 1}/{len(images)}: {os.path.basename(image_path)}")
+            images = []
+            for page_num, img in self.iter_page_images(pdf_path):
+                if save_to_disk:
+                    self._save_debug_image(img, output_dir, page_num)
+                images.append(img)
             
-            else:
-                raise RuntimeError("No PDF processing library available")
-            
-            logger.info(f"✓ Extracted {len(image_paths)} pages as images")
-            return image_paths
+            logger.info(f"✓ Rendered {len(images)} pages as images")
+            return images
             
         except Exception as e:
             logger.error(f"Error extracting PDF pages: {e}", exc_info=True)
             raise
     
-    def _check_rpm_limit(self):
+    def _save_debug_image(self, img, output_dir, page_num):
+        """Save a rendered page as PNG in output_dir (debugging only)."""
+        os.makedirs(output_dir, exist_ok=True)
+        img.save(os.path.join(output_dir, f"page_{page_num:03d}.png"), 'PNG')
+    
+    def _estimate_tokens(self, img, prompt):
         """
-        Check if we're within RPM limits (250 for Tier 1).
-        Called before batch processing to ensure we don't exceed limits.
-        Note: With parallel processing and 1M TPM, we have ample headroom.
+        Rough input-token estimate for one page request (for the TPM bucket).
+        Gemini bills images as 258 tokens per 768x768 tile; text is ~4 chars/token.
         """
-        current_time = time.time()
-        
-        # Track calls per minute
-        if current_time - self.api_call_window_start >= 60:
-            # Reset window
-            if self.api_call_count > 0:
-                logger.info(f"Rate limit window reset: {self.api_call_count} calls in last minute")
-            self.api_call_count = 0
-            self.api_call_window_start = current_time
-        
-        # Check if we're approaching RPM limit
-        if self.api_call_count >= self.RPM_LIMIT:
-            wait_time = 60 - (current_time - self.api_call_window_start)
-            if wait_time > 0:
-                logger.warning(f"RPM limit reached ({self.RPM_LIMIT}), waiting {wait_time:.1f}s")
-                time.sleep(wait_time)
-                self.api_call_count = 0
-                self.api_call_window_start = time.time()
+        tiles = -(-img.width // 768) * -(-img.height // 768)  # ceil division
+        return tiles * 258 + len(prompt) // 4
     
     def _get_page_extraction_prompt(self):
         """
         Get the optimized prompt for PDF page table extraction.
         Simplified version focusing on table extraction from a single page.
         """
-        return """You are an EXPERT TABLE EXTRACTION system. Extract ALL tables from this PDF page with PERFECT accuracy.
-
-📋 INSTRUCTIONS:
-
-1. **IDENTIFY ALL TABLES:**
-   - Detect tables with visible borders
-   - Detect borderless tables (aligned columns)
-   - Include all tabular data on the page
-
-2. **EXTRACT STRUCTURE:**
-   - Count exact rows and columns
-   - Identify header rows
-   - Handle merged cells (put text in first cell)
-
-3. **EXTRACT CONTENT:**
-   - Read each cell exactly as shown
-   - Preserve numbers precisely (2250 not 2200)
-   - Keep formatting (currency symbols, decimals)
-   - Empty cells: "" (empty string)
-
-4. **OUTPUT FORMAT (STRICT JSON):**
-```json
-{
-  "page_number": <page number from image filename or 1>,
-  "tables_found": <number of tables on this page>,
-  "tables": [
-    {
-      "table_id": <1, 2, 3... if multiple tables>,
-      "metadata": {
-        "total_rows": <row count>,
-        "total_columns": <column count>,
-        "has_headers": true|false
-      },
-      "headers": ["Column1", "Column2", ...],
-      "data": [
-        ["row1_col1", "row1_col2", ...],
-        ["row2_col1", "row2_col2", ...],
-        ...
-      ]
-    }
-  ],
-  "extraction_notes": "Brief quality notes"
-}
-```
-
-✅ QUALITY REQUIREMENTS:
-☑ All tables on page extracted
-☑ Exact cell values (no approximation)
-☑ Correct row/column counts
-☑ Headers properly identified
-☑ Empty cells marked as ""
-
-🚀 BEGIN EXTRACTION:"""
+        return self._EXTRACTION_PROMPT
     
-    def extract_table_from_page(self, image_path, page_number):
+    def extract_table_from_page(self, img, page_number):
         """
         Extract table from a single PDF page image using Gemini.
         
         Args:
-            image_path (str): Path to page image
+            img (PIL.Image.Image): Rendered page image
             page_number (int): Page number (1-indexed)
         
         Returns:
-            dict: Extraction result
-                {
-                    'success': bool,
-                    'page_number': int,
-                    'tables': [...],
-                    'error': str (if failed)
-                }
+            PageResult: Extraction result (success, page_number, tables, error if failed)
         """
         try:
-            # Track API call (rate limiting done at batch level)
-            self.api_call_count += 1
-            
             logger.info(f"🤖 Processing page {page_number} with Gemini...")
             
-            # Load image
-            img = Image.open(image_path)
+            cache_key = self._page_cache_key(img)
+            cached = self._page_cache_fetch(cache_key)
+            if cached is not None:
+                logger.info(f"  ✓ Page {page_number}: {len(cached['tables'])} table(s) from cache")
+                return PageResult(page_number, True, cached['tables'], metadata=cached['metadata'])
             
             # Get extraction prompt
-            prompt = self._get_page_extraction_prompt()
-            
-            # Generate response with Gemini
-            response = self.model.generate_content([prompt, img])
+            prompt = self._EXTRACTION_PROMPT
+            
+            # Page is encoded once (JPEG) and reused if the request escalates
+            image_part = self._encode_page_image(img)
+            estimated_tokens = self._estimate_tokens(img, prompt)
+            request = (prompt, image_part, estimated_tokens, page_number)
+            
+            # Cheap first pass; escalate when flash-lite returns malformed output or no tables
+            tier = 'fast'
+            try:
+                result = self._request_page_tables(self.model_fast, *request)
+                escalate = result is not None and not result['tables']
+            except ValueError as e:  # Includes JSON decode errors
+                logger.info(f"  Page {page_number}: {self.FAST_MODEL} output unusable ({e})")
+                escalate = True
+            
+            if escalate:
+                logger.info(f"  ↪ Page {page_number}: retrying with {self.ACCURATE_MODEL}")
+                tier = 'accurate'
+                result = self._request_page_tables(self.model_accurate, *request)
             
             # Handle blocked/filtered responses
-            if not response or not response.text:
-                if hasattr(response, 'prompt_feedback'):
-                    logger.warning(f"Page {page_number} blocked: {response.prompt_feedback}")
-                    return {
-                        'success': False,
-                        'page_number': page_number,
-                        'tables': [],
-                        'error': 'Content filtered by Gemini safety settings'
-                    }
-                raise ValueError("Empty response from Gemini API")
-            
-            # Extract JSON from response
-            response_text = response.text.strip()
-            json_text = self._extract_json_from_response(response_text)
-            
-            # Parse JSON
-            result = json.loads(json_text)
-            
-            # Validate structure
-            if 'tables' not in result:
-                raise ValueError("Response missing 'tables' field")
+            if result is None:
+                return PageResult(page_number, False, error='Content filtered by Gemini safety settings')
+            
+            with self._stats_lock:
+                self.tier_usage[tier] += 1
             
             # Log success
             tables_count = len(result.get('tables', []))
-            logger.info(f"  ✓ Page {page_number}: {tables_count} table(s) extracted")
+            logger.info(f"  ✓ Page {page_number}: {tables_count} table(s) extracted ({tier})")
             
-            return {
-                'success': True,
-                'page_number': page_number,
-                'tables': result.get('tables', []),
-                'metadata': {
-                    'tables_found': result.get('tables_found', tables_count),
-                    'extraction_notes': result.get('extraction_notes', '')
-                }
-            }
+            page_result = PageResult(page_number, True, result.get('tables', []), metadata={
+                'tables_found': result.get('tables_found', tables_count),
+                'extraction_notes': result.get('extraction_notes', ''),
+                'model': self.ACCURATE_MODEL if tier == 'accurate' else self.FAST_MODEL
+            })
+            self._page_cache_store(cache_key, page_result)
+            return page_result
             
         except json.JSONDecodeError as e:
             logger.error(f"Page {page_number} JSON parse error: {e}")
-            logger.error(f"Raw response (first 300 chars): {response_text[:300]}...")
-            return {
-                'success': False,
-                'page_number': page_number,
-                'tables': [],
-                'error': f'Failed to parse Gemini response: {str(e)}'
-            }
+            return PageResult(page_number, False, error=f'Failed to parse Gemini response: {str(e)}')
             
         except Exception as e:
             logger.error(f"Page {page_number} extraction error: {e}", exc_info=True)
-            return {
-                'success': False,
-                'page_number': page_number,
-                'tables': [],
-                'error': f'Extraction failed: {str(e)}'
-            }
+            return PageResult(page_number, False, error=f'Extraction failed: {str(e)}')
+    
+    def _page_cache_key(self, img):
+        """BLAKE2b over the rendered page pixels plus the model/prompt salt"""
+        hasher = hashlib.blake2b(img.tobytes(), digest_size=16)
+        hasher.update(self._PAGE_CACHE_SALT)
+        return hasher.hexdigest()
+    
+    def _page_cache_path(self, key):
+        return self._page_cache_dir / f"{key}.json"
+    
+    def _page_cache_fetch(self, key):
+        """
+        Load a cached page result.
+        
+        Returns:
+            dict: {'tables': [...], 'metadata': {...}}, or None on a miss or expired entry
+        """
+        cached_path = self._page_cache_path(key)
+        try:
+            if time.time() - cached_path.stat().st_mtime > self.PAGE_CACHE_TTL:
+                cached_path.unlink(missing_ok=True)
+                return None
+            return _json_loads(cached_path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Page cache read failed for {key[:12]}: {e}")
+            return None
+    
+    def _page_cache_store(self, key, page_result):
+        """Write a successful page result to the cache atomically (tmp + os.replace)"""
+        tmp_path = self._page_cache_dir / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            tmp_path.write_text(json.dumps({'tables': page_result.tables, 'metadata': page_result.metadata},
+                                           ensure_ascii=False), encoding='utf-8')
+            os.replace(tmp_path, self._page_cache_path(key))
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Page cache write failed for {key[:12]}: {e}")
+            tmp_path.unlink(missing_ok=True)
+        
+        if next(self._page_cache_stores) % self.PAGE_CACHE_PRUNE_EVERY == 0:
+            self._prune_page_cache()
+    
+    def _prune_page_cache(self):
+        """Delete expired page results and cap the entry count (they hold extracted user data)"""
+        removed = prune_cache_dir(self._page_cache_dir, self.PAGE_CACHE_TTL,
+                                  max_entries=self.PAGE_CACHE_MAX_ENTRIES)
+        if removed:
+            logger.info(f"🧹 Page cache: removed {removed} expired/excess entries")
+    
+    def _request_page_tables(self, model, prompt, image_part, estimated_tokens, page_number):
+        """
+        Run one extraction request against `model` and parse its JSON payload.
+        
+        Returns:
+            dict: Parsed page result, or None if Gemini's safety filters blocked the page
+        
+        Raises:
+            ValueError: Empty or malformed response (json.JSONDecodeError included)
+        """
+        response = self._call_gemini_with_retry(model, prompt, image_part, estimated_tokens, page_number)
+        
+        # Check for blocking before touching .text (it raises ValueError on blocked
+        # responses, which would otherwise look like bad output and escalate)
+        blocked = self._blocked_reason(response)
+        if blocked:
+            logger.warning(f"Page {page_number} blocked: {blocked}")
+            return None
+        
+        if not response.text:
+            raise ValueError("Empty response from Gemini API")
+        
+        # Extract JSON from response
+        response_text = response.text.strip()
+        json_text = self._extract_json_from_response(response_text)
+        
+        try:
+            result = _json_loads(json_text)
+        except json.JSONDecodeError:
+            logger.debug(f"Page {page_number} raw response (first 300 chars): {response_text[:300]}...")
+            raise
+        
+        # Validate structure
+        if 'tables' not in result:
+            raise ValueError("Response missing 'tables' field")
+        return result
+    
+    _BLOCKED_FINISH_REASONS = frozenset({'SAFETY', 'RECITATION', 'BLOCKLIST', 'PROHIBITED_CONTENT', 'SPII'})
+    
+    @classmethod
+    def _blocked_reason(cls, response):
+        """Why Gemini refused to answer (prompt blocked, no candidates, safety stop), or None"""
+        if response is None:
+            return None
+        
+        block_reason = getattr(getattr(response, 'prompt_feedback', None), 'block_reason', None)
+        if block_reason:  # BLOCK_REASON_UNSPECIFIED (0) means not blocked
+            return f"prompt blocked ({getattr(block_reason, 'name', block_reason)})"
+        
+        candidates = getattr(response, 'candidates', None)
+        if candidates is None:
+            return None
+        if not candidates:
+            return 'no candidates returned'
+        
+        finish_reason = getattr(candidates[0], 'finish_reason', None)
+        finish_name = getattr(finish_reason, 'name', None)
+        if finish_name in cls._BLOCKED_FINISH_REASONS:
+            return f"response stopped ({finish_name})"
+        return None
+    
+    def _call_gemini_with_retry(self, model, prompt, image_part, estimated_tokens, page_number, max_retries=3):
+        """
+        Call Gemini for one page, retrying transient failures (429, 5xx, timeouts)
+        with jittered exponential backoff. The last error is raised if every attempt fails.
+        """
+        def _request():
+            self.rpm_bucket.acquire(1)
+            self.tpm_bucket.acquire(estimated_tokens)
+            with self.gemini_slots:
+                return model.generate_content([prompt, image_part])
+        
+        return call_with_backoff(_request, max_attempts=max_retries, retryable=is_transient_error,
+                                 label=f"Page {page_number} Gemini call", on_retry=self._record_retry)
+    
+    def _record_retry(self, exc):
+        with self._stats_lock:
+            self.retry_count += 1
+    
+    def _encode_page_image(self, img):
+        """
+        Encode a rendered page as an in-memory JPEG blob for the Gemini request.
+        
+        Passing a raw PIL image makes the SDK re-encode it losslessly (PNG/WebP),
+        which is several times larger to upload for no accuracy gain.
+        """
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        buf = io.BytesIO()
+        img.save(buf, 'JPEG', quality=self.JPEG_QUALITY, optimize=False)
+        return {'mime_type': 'image/jpeg', 'data': buf.getvalue()}
     
     def _extract_json_from_response(self, response_text):
         """
@@ -443,17 +722,13 @@ class PDFToExcelExtractor:
         Returns:
             str: Cleaned JSON string
         """
-        # Handle markdown JSON code blocks
-        if "```json" in response_text:
-            json_start = response_text.find("```json") + 7
-            json_end = response_text.find("```", json_start)
-            return response_text[json_start:json_end].strip()
-        elif "```" in response_text:
-            json_start = response_text.find("```") + 3
-            json_end = response_text.find("```", json_start)
-            return response_text[json_start:json_end].strip()
-        else:
+        # Handle markdown JSON code blocks (an unclosed fence keeps everything after it)
+        _, sep, rest = response_text.partition("```json")
+        if not sep:
+            _, sep, rest = response_text.partition("```")
+        if not sep:
             return response_text.strip()
+        return rest.partition("```")[0].strip()
     
     def process_pdf(self, pdf_path, output_dir=None, progress_callback=None):
         """
@@ -461,7 +736,7 @@ class PDFToExcelExtractor:
         
         Args:
             pdf_path (str): Path to PDF file
-            output_dir (str, optional): Directory for temporary files and output
+            output_dir (str, optional): Keep debug PNG copies of each page here (default: in-memory only)
             progress_callback (callable, optional): Callback function for progress updates
                 Signature: callback(current_page, total_pages, status, message)
         
@@ -478,6 +753,7 @@ class PDFToExcelExtractor:
                 }
         """
         start_time = time.time()
+        retries_before = self.retry_count
         
         try:
             # Step 1: Validate PDF
@@ -498,78 +774,79 @@ class PDFToExcelExtractor:
             total_pages = validation['page_count']
             logger.info(f"📄 Processing PDF: {total_pages} pages")
             
-            # Step 2: Create temporary directory for page images
-            if output_dir is None:
-                output_dir = os.path.join(os.path.dirname(pdf_path), f'pdf_pages_{int(time.time())}')
-            
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # Step 3: Extract pages as images
+            # Step 2+3: Pipeline rendering into PARALLEL Gemini calls - each page is
+            # submitted as soon as it is rendered instead of after the whole PDF
             if progress_callback:
                 progress_callback(0, total_pages, 'extracting', 'Extracting PDF pages...')
             
-            image_paths = self.extract_pages_as_images(pdf_path, output_dir)
-            
-            # Step 4: Check RPM limit before parallel processing
-            self._check_rpm_limit()
-            
-            # Step 5: Process all pages in PARALLEL for 10x speed improvement
-            page_results = []
+            save_to_disk = output_dir is not None  # PNG copies only for debugging
+            page_results = [None] * total_pages  # Filled by page index, so already in page order
             successful_pages = 0
-            failed_pages = 0
             completed_count = 0
+            last_progress = 0.0  # Per-conversion (the extractor instance is shared)
             
-            logger.info(f"🚀 Starting PARALLEL processing of {len(image_paths)} pages...")
+            logger.info(f"🚀 Starting PARALLEL processing of {total_pages} pages...")
             
             # Use ThreadPoolExecutor for parallel Gemini API calls
-            # Max workers = number of pages (up to 25)
-            max_workers = min(len(image_paths), 25)
+            # Max workers = number of pages (up to MAX_CONCURRENT_GEMINI); queued pages
+            # wait for a worker instead of bursting every page's tokens at once
+            max_workers = min(total_pages, self.MAX_CONCURRENT_GEMINI)
             
             with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # Submit all pages for processing simultaneously
-                future_to_page = {
-                    executor.submit(self.extract_table_from_page, image_path, idx + 1): (idx + 1, image_path)
-                    for idx, image_path in enumerate(image_paths)
-                }
+                # Submit each page for processing the moment it is rendered;
+                # each future carries its own page number (no future -> page map)
+                futures = []
+                try:
+                    for page_num, img in self.iter_page_images(pdf_path, skip_blank=True):
+                        if img is None:
+                            # Blank page: nothing to extract, no API call
+                            logger.info(f"⏭️  Page {page_num} is blank, skipping Gemini call")
+                            page_results[page_num - 1] = PageResult(page_num, True, metadata={'skipped': 'blank'})
+                            successful_pages += 1
+                            completed_count += 1
+                            continue
+                        if save_to_disk:
+                            self._save_debug_image(img, output_dir, page_num)
+                        future = executor.submit(self.extract_table_from_page, img, page_num)
+                        future.page_number = page_num
+                        futures.append(future)
+                except Exception:
+                    # Rendering failed partway: the PDF is reported as failed, so don't
+                    # spend Gemini calls on the pages that are still queued
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
                 
                 # Collect results as they complete
-                for future in as_completed(future_to_page):
-                    page_num, image_path = future_to_page[future]
+                for future in as_completed(futures):
+                    page_num = future.page_number
                     completed_count += 1
                     
                     try:
                         result = future.result()
-                        page_results.append(result)
+                        page_results[page_num - 1] = result
+                        successful_pages += result.success
                         
-                        if result['success']:
-                            successful_pages += 1
+                        if result.success:
                             logger.info(f"✓ Page {page_num}/{total_pages} completed ({completed_count}/{total_pages} done)")
                         else:
-                            failed_pages += 1
-                            logger.warning(f"⚠️  Page {page_num} failed: {result.get('error', 'Unknown error')}")
+                            logger.warning(f"⚠️  Page {page_num} failed: {result.error or 'Unknown error'}")
                         
-                        # Update progress callback
+                        # Update progress callback (coalesced: pages often finish in bursts)
                         if progress_callback:
-                            progress_callback(completed_count, total_pages, 'processing', 
-                                             f'Processing: {completed_count}/{total_pages} pages complete...')
+                            now = time.monotonic()
+                            if now - last_progress >= self.PROGRESS_INTERVAL or completed_count == total_pages:
+                                last_progress = now
+                                progress_callback(completed_count, total_pages, 'processing', 
+                                                 f'Processing: {completed_count}/{total_pages} pages complete...')
                     
                     except Exception as e:
                         # Handle execution errors
                         logger.error(f"❌ Page {page_num} execution error: {e}", exc_info=True)
-                        failed_pages += 1
-                        page_results.append({
-                            'success': False,
-                            'page_number': page_num,
-                            'tables': [],
-                            'error': f'Execution failed: {str(e)}'
-                        })
+                        page_results[page_num - 1] = PageResult(page_num, False, error=f'Execution failed: {str(e)}')
             
-            # Sort results by page number to maintain correct order
-            page_results.sort(key=lambda x: x['page_number'])
+            failed_pages = completed_count - successful_pages
             
-            # API call count already updated in extract_table_from_page()
-            
-            # Step 6: Calculate processing time
+            # Step 4: Calculate processing time
             processing_time = time.time() - start_time
             
             logger.info(f"✅ PARALLEL PDF processing complete:")
@@ -578,7 +855,10 @@ class PDFToExcelExtractor:
             logger.info(f"   Failed: {failed_pages}")
             logger.info(f"   Time: {processing_time:.2f}s (~{processing_time/total_pages:.1f}s per page)")
             logger.info(f"   Speed: {total_pages/(processing_time/60):.1f} pages/minute")
-            logger.info(f"   API calls: {len(image_paths)} (parallel)")
+            logger.info(f"   API calls: {len(futures)} (parallel), "
+                        f"retries: {self.retry_count - retries_before} ({self.retry_count} since startup)")
+            logger.info(f"   Model tiers since startup: {self.tier_usage['fast']} fast, "
+                        f"{self.tier_usage['accurate']} accurate")
             
             if progress_callback:
                 progress_callback(total_pages, total_pages, 'complete', 
@@ -586,13 +866,11 @@ class PDFToExcelExtractor:
             
             return {
                 'success': successful_pages > 0,  # Success if at least one page processed
-                'page_results': page_results,
+                'page_results': [r.to_dict() for r in page_results],
                 'total_pages': total_pages,
                 'successful_pages': successful_pages,
                 'failed_pages': failed_pages,
-                'processing_time': processing_time,
-                'image_paths': image_paths,  # For cleanup
-                'temp_dir': output_dir
+                'processing_time': processing_time
             }
             
         except Exception as e:
@@ -606,28 +884,3 @@ class PDFToExcelExtractor:
                 'processing_time': time.time() - start_time,
                 'error': f'PDF processing failed: {str(e)}'
             }
-    
-    def cleanup_temp_files(self, temp_dir, image_paths):
-        """
-        Clean up temporary files created during processing.
-        
-        Args:
-            temp_dir (str): Temporary directory path
-            image_paths (list): List of image file paths to delete
-        """
-        try:
-            # Delete image files
-            for image_path in image_paths:
-                if os.path.exists(image_path):
-                    os.remove(image_path)
-                    logger.debug(f"Deleted: {image_path}")
-            
-            # Delete temporary directory if empty
-            if os.path.exists(temp_dir) and not os.listdir(temp_dir):
-                os.rmdir(temp_dir)
-                logger.debug(f"Deleted temp dir: {temp_dir}")
-            
-            logger.info("🧹 Cleanup complete")
-            
-        except Exception as e:
-            logger.warning(f"Cleanup warning: {e}")
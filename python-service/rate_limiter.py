@@ -0,0 +1,137 @@
+"""
+Rate Limiting Helpers for Gemini API Calls
+Keeps bursty workloads under Gemini's RPM/TPM quotas instead of tripping 429s
+
+Features:
+- Thread-safe token bucket (continuous refill, blocks until capacity is available)
+- Jittered exponential-backoff retry for rate-limit (429 / RESOURCE_EXHAUSTED) errors
+- Optional retry predicate for transient server/network errors (5xx, timeouts)
+- Honors Retry-After when the API response provides one
+"""
+
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute / 60` tokens per second.
+
+    Usage:
+        rpm_bucket = TokenBucket(90)        # requests per minute
+        tpm_bucket = TokenBucket(27_000)    # tokens per minute
+        rpm_bucket.acquire()
+        tpm_bucket.acquire(len(text) // 4)
+    """
+
+    def __init__(self, per_minute, burst=None):
+        """
+        Args:
+            per_minute (float): Sustained budget per minute
+            burst (float, optional): Bucket capacity (default: one full minute of budget)
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst if burst is not None else per_minute)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self, tokens=1):
+        """
+        Block until `tokens` are available, then consume them.
+
+        Requests larger than the bucket capacity are clamped to the capacity
+        so they wait for a full bucket instead of blocking forever.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        tokens = min(float(tokens), self.capacity)
+        waited = 0.0
+
+        with self._cond:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+
+                wait_time = (tokens - self._tokens) / self.rate
+                self._cond.wait(timeout=wait_time)
+                waited += wait_time
+
+
+def is_rate_limit_error(exc):
+    """True for HTTP 429 / RESOURCE_EXHAUSTED errors from either Gemini SDK."""
+    if getattr(exc, 'code', None) == 429:
+        return True
+    return 'RESOURCE_EXHAUSTED' in str(exc)
+
+
+_TRANSIENT_STATUS = frozenset({429, 500, 502, 503, 504})
+_TRANSIENT_MARKERS = ('RESOURCE_EXHAUSTED', 'UNAVAILABLE', 'DEADLINE_EXCEEDED', 'INTERNAL')
+
+
+def is_transient_error(exc):
+    """True for errors worth retrying: rate limits, 5xx responses, timeouts and dropped connections."""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    if getattr(exc, 'code', None) in _TRANSIENT_STATUS:
+        return True
+    message = str(exc)
+    return any(marker in message for marker in _TRANSIENT_MARKERS)
+
+
+def _retry_after_seconds(exc):
+    """Read a Retry-After header (seconds) off the failed response, if any."""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def call_with_backoff(func, max_attempts=5, min_wait=1.0, max_wait=30.0,
+                      retryable=is_rate_limit_error, label='Gemini API call', on_retry=None):
+    """
+    Call `func()` and retry retryable errors with jittered exponential backoff.
+
+    Args:
+        func (callable): Zero-argument callable performing the API request
+        max_attempts (int): Total attempts including the first one
+        min_wait (float): Delay before the first retry (doubles each attempt)
+        max_wait (float): Upper bound for any single delay
+        retryable (callable): Predicate deciding whether an exception is worth retrying
+        label (str): Description used in log messages
+        on_retry (callable, optional): Called with the exception before each retry
+
+    Returns:
+        Whatever `func()` returns; the last exception is re-raised on final failure.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= max_attempts or not retryable(e):
+                raise
+
+            # Random jitter keeps parallel workers that failed together from retrying in lockstep
+            delay = _retry_after_seconds(e) or min_wait * (2 ** (attempt - 1) + random.random())
+            delay = min(delay, max_wait)
+            logger.warning(f"{label} failed with {type(e).__name__} (attempt {attempt}/{max_attempts}), "
+                           f"retrying in {delay:.1f}s")
+            if on_retry is not None:
+                on_retry(e)
+            time.sleep(delay)
@@ -11,12 +11,18 @@ Write-Host "Checking Python installation..." -ForegroundColor Yellow
 $pythonCmd = Get-Command python -ErrorAction SilentlyContinue
 if (-not $pythonCmd) {
     Write-Host "ERROR: Python not found!" -ForegroundColor Red
-    Write-Host "Please install Python 3.8+ from https://www.python.org/downloads/" -ForegroundColor Red
+    Write-Host "Please install Python 3.10+ from https://www.python.org/downloads/" -ForegroundColor Red
     exit 1
 }
 
 $pythonVersion = python --version
 Write-Host "Found: $pythonVersion" -ForegroundColor Green
+python -c "import sys; sys.exit(sys.version_info < (3, 10))"
+if ($LASTEXITCODE -ne 0) {
+    Write-Host "ERROR: Python 3.10+ is required" -ForegroundColor Red
+    Write-Host "Please install Python 3.10+ from https://www.python.org/downloads/" -ForegroundColor Red
+    exit 1
+}
 Write-Host ""
 
 # Check if we're in the right directory
@@ -10,11 +10,16 @@ echo ""
 echo "Checking Python installation..."
 if ! command -v python3 &> /dev/null; then
     echo "ERROR: Python 3 not found!"
-    echo "Please install Python 3.8+ from https://www.python.org/downloads/"
+    echo "Please install Python 3.10+ from https://www.python.org/downloads/"
     exit 1
 fi
 
 python3 --version
+if ! python3 -c 'import sys; sys.exit(sys.version_info < (3, 10))'; then
+    echo "ERROR: Python 3.10+ is required"
+    echo "Please install Python 3.10+ from https://www.python.org/downloads/"
+    exit 1
+fi
 echo ""
 
 # Create virtual environment
@@ -4,169 +4,336 @@ Tracks and enforces daily usage limits (100 conversions per day)
 Resets at midnight UTC
 """
 
+import atexit
 import json
 import os
-from datetime import datetime, date
-from pathlib import Path
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Optional fast JSON parser for the legacy snapshot (orjson reads bytes directly)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Optional Redis backend for multi-host deploys (enabled by REDIS_URL)
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# Keys a legacy usage_data.json snapshot must contain to be importable
+_LEGACY_REQUIRED_KEYS = frozenset({'date', 'count'})
+
+SECONDS_PER_DAY = 86400
+
+
+def _utc_day_string(day_idx):
+    """ISO date of a UTC day index (days since the Unix epoch)."""
+    return datetime.fromtimestamp(day_idx * SECONDS_PER_DAY, tz=timezone.utc).date().isoformat()
+
 class DailyUsageTracker:
     """
     Tracks daily usage of the PDF to Excel service.
-    
+
     Features:
     - Daily limit enforcement (default: 100 conversions/day)
-    - Automatic reset at midnight UTC
-    - Persistent storage (survives service restarts)
+    - Automatic reset at midnight UTC (one counter row per UTC day)
+    - Persistent storage in SQLite (WAL mode): survives restarts and is shared
+      by every gunicorn worker, so the limit holds across processes
+    - Redis backend (atomic INCR) when REDIS_URL is set, for multi-host deploys
     - Thread-safe operations
     """
-    
+
     DAILY_LIMIT = 100  # Max conversions per day
-    STORAGE_FILE = 'usage_data.json'
-    
+    STORAGE_FILE = 'usage_data.db'
+    LEGACY_FILE = 'usage_data.json'  # Pre-SQLite snapshot (+ '.log'), imported once
+    LEGACY_LOG_RECORD = b'+\n'
+    REDIS_KEY_PREFIX = 'usage:'
+
+    _INCREMENT_SQL = (
+        "INSERT INTO usage (day, count) VALUES (?, 1) "
+        "ON CONFLICT(day) DO UPDATE SET count = count + 1 RETURNING count"
+    )
+
     def __init__(self, storage_dir=None, daily_limit=None):
         """
         Initialize usage tracker.
-        
+
         Args:
             storage_dir (str, optional): Directory to store usage data
             daily_limit (int, optional): Override default daily limit
         """
         if daily_limit is not None:
             self.DAILY_LIMIT = daily_limit
-        
+
+        # Over-quota answer depends only on the limit, so build it once
+        self._exceeded_result = (
+            False,
+            0,
+            f"Daily quota exceeded ({self.DAILY_LIMIT} conversions per day). Resets at midnight UTC."
+        )
+
         # Set storage path
         if storage_dir is None:
             storage_dir = os.path.dirname(os.path.abspath(__file__))
-        
+
         self.storage_path = os.path.join(storage_dir, self.STORAGE_FILE)
-        
-        # Load existing usage data
-        self.usage_data = self._load_usage_data()
-        
-        # Check if we need to reset (new day)
-        self._check_and_reset_if_needed()
-        
-        logger.info(f"📊 Usage tracker initialized: {self.usage_data['count']}/{self.DAILY_LIMIT} used today")
-    
-    def _load_usage_data(self):
-        """Load usage data from storage file."""
-        if os.path.exists(self.storage_path):
-            try:
-                with open(self.storage_path, 'r') as f:
-                    data = json.load(f)
-                    # Validate structure
-                    if 'date' in data and 'count' in data:
-                        return data
-            except Exception as e:
-                logger.warning(f"Error loading usage data: {e}")
-        
-        # Return default data if file doesn't exist or is invalid
-        return {
-            'date': str(date.today()),
-            'count': 0,
-            'limit': self.DAILY_LIMIT
-        }
-    
-    def _save_usage_data(self):
-        """Save usage data to storage file."""
+
+        # Serializes this process's use of the shared connection; SQLite itself
+        # makes each statement atomic across processes
+        self._lock = threading.Lock()
+
+        # Current quota day (UTC day index + its ISO date, the storage key);
+        # rollover is only re-checked once _rollover_ts passes
+        self._day_idx = None
+        self._today = None
+        self._rollover_ts = 0
+
+        # get_usage_info() result, reused while the stored count still equals _info_used
+        self._info_cache = None
+        self._info_used = -1
+
+        # Today's SQLite count as last seen, valid while PRAGMA data_version is
+        # unchanged (it only moves when another connection commits)
+        self._seen_count = 0
+        self._seen_version = None
+
+        # Shared counter store: Redis if configured, otherwise the local SQLite file
+        self._redis = None
+        self._db = None
+        redis_url = os.getenv('REDIS_URL')
+        if redis_url and REDIS_AVAILABLE:
+            self._redis = redis.Redis.from_url(redis_url)
+        else:
+            if redis_url:
+                logger.warning("REDIS_URL is set but the redis package is not installed; using SQLite")
+            self._db = self._connect()
+        atexit.register(self.close)
+
+        with self._lock:
+            self._check_and_reset_if_needed()
+            if self._db is not None:
+                self._import_legacy_usage(storage_dir)
+            used = self._read_count()
+
+        backend = 'Redis' if self._redis is not None else 'SQLite'
+        logger.info("📊 Usage tracker initialized (%s): %d/%d used today", backend, used, self.DAILY_LIMIT)
+
+    def _connect(self):
+        """Open the usage database (autocommit, WAL) and create the table if needed."""
+        conn = sqlite3.connect(self.storage_path, timeout=5.0, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")  # Readers never block the writer
+        conn.execute("PRAGMA synchronous=NORMAL")  # WAL-safe; no fsync per increment
+        conn.execute("CREATE TABLE IF NOT EXISTS usage (day TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        return conn
+
+    def _import_legacy_usage(self, storage_dir):
+        """
+        Carry today's count over from the old JSON snapshot + append-only log
+        (caller holds the lock). The legacy files are removed once imported.
+        """
+        legacy_path = os.path.join(storage_dir, self.LEGACY_FILE)
+        log_path = legacy_path + '.log'
+        if not os.path.exists(legacy_path):
+            return
+
         try:
-            self.usage_data['limit'] = self.DAILY_LIMIT  # Always update limit
-            with open(self.storage_path, 'w') as f:
-                json.dump(self.usage_data, f, indent=2)
+            with open(legacy_path, 'rb') as f:
+                data = _json_loads(f.read())
+            # Validate structure
+            if _LEGACY_REQUIRED_KEYS <= data.keys() and data['date'] == self._today:
+                count = data['count']
+                if os.path.exists(log_path):
+                    count += os.path.getsize(log_path) // len(self.LEGACY_LOG_RECORD)
+                self._db.execute("INSERT OR IGNORE INTO usage (day, count) VALUES (?, ?)", (self._today, count))
+                logger.info(f"📥 Imported {count} conversions for {self._today} from {self.LEGACY_FILE}")
+
+            os.remove(legacy_path)
+            if os.path.exists(log_path):
+                os.remove(log_path)
         except Exception as e:
-            logger.error(f"Error saving usage data: {e}")
-    
+            logger.warning(f"Error importing legacy usage data: {e}")
+
+    def _read_count(self, day=None):
+        """Conversions recorded for `day` (default: today) across all processes."""
+        day = day or self._today
+        if self._redis is not None:
+            value = self._redis.get(self.REDIS_KEY_PREFIX + day)
+            return int(value) if value is not None else 0
+
+        if day != self._today:
+            return self._query_count(day)
+
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._seen_version:
+            self._seen_count = self._query_count(day)
+            self._seen_version = version
+        return self._seen_count
+
+    def _query_count(self, day):
+        row = self._db.execute("SELECT count FROM usage WHERE day = ?", (day,)).fetchone()
+        return row[0] if row else 0
+
+    def _redis_expiry(self):
+        """Keep each day's key until one day after it ends (so the rollover log can still read it)."""
+        return self._rollover_ts + SECONDS_PER_DAY
+
+    def _increment_count(self, day):
+        """Atomically add one conversion for `day` and return the new total."""
+        if self._redis is not None:
+            key = self.REDIS_KEY_PREFIX + day
+            pipe = self._redis.pipeline()
+            pipe.incr(key)
+            pipe.expireat(key, self._redis_expiry())
+            return pipe.execute()[0]
+
+        # Our own commits leave data_version unchanged, so keep the cached count in step
+        self._seen_count = self._db.execute(self._INCREMENT_SQL, (day,)).fetchall()[0][0]
+        return self._seen_count
+
+    def _reset_count(self, day):
+        """Zero the counter for `day`."""
+        if self._redis is not None:
+            self._redis.set(self.REDIS_KEY_PREFIX + day, 0, exat=self._redis_expiry())
+            return
+
+        self._db.execute("UPDATE usage SET count = 0 WHERE day = ?", (day,))
+        self._seen_count = 0
+
+    def close(self):
+        """Close the backend connection (called automatically at exit)."""
+        with self._lock:
+            if self._redis is not None:
+                self._redis.close()
+            else:
+                self._db.close()
+
     def _check_and_reset_if_needed(self):
-        """Check if it's a new day and reset counter if needed."""
-        today = str(date.today())
-        
-        if self.usage_data['date'] != today:
-            # New day - reset counter
-            old_count = self.usage_data['count']
-            self.usage_data = {
-                'date': today,
-                'count': 0,
-                'limit': self.DAILY_LIMIT
-            }
-            self._save_usage_data()
-            logger.info(f"🔄 New day reset: Previous day had {old_count} conversions")
-    
+        """Check if it's a new day and switch to its counter if needed (caller holds the lock)."""
+        # Fast path: a single timestamp compare until the next UTC midnight
+        if time.time() < self._rollover_ts:
+            return
+
+        day_idx = int(time.time()) // SECONDS_PER_DAY
+        self._rollover_ts = (day_idx + 1) * SECONDS_PER_DAY
+
+        if day_idx != self._day_idx:
+            # New day - a fresh row starts at zero; the old one stays as history
+            previous_day = self._today
+            self._day_idx = day_idx
+            self._today = _utc_day_string(day_idx)
+            self._info_cache = None
+            self._info_used = -1
+            self._seen_version = None
+            # Only query the previous day's total if the log line will actually be emitted
+            if previous_day is not None and logger.isEnabledFor(logging.INFO):
+                logger.info("🔄 New day reset: Previous day had %d conversions", self._read_count(previous_day))
+
     def check_quota(self):
         """
         Check if conversion is allowed based on daily quota.
-        
+
         Returns:
             tuple: (allowed: bool, remaining: int, message: str)
+                message is only set when not allowed; use format_remaining(remaining)
+                to describe an allowed request
         """
-        self._check_and_reset_if_needed()
-        
-        remaining = self.DAILY_LIMIT - self.usage_data['count']
-        
+        with self._lock:
+            self._check_and_reset_if_needed()
+            remaining = self.DAILY_LIMIT - self._read_count()
+
         if remaining <= 0:
-            return (
-                False, 
-                0, 
-                f"Daily quota exceeded ({self.DAILY_LIMIT} conversions per day). Resets at midnight UTC."
-            )
-        
-        return (True, remaining, f"{remaining} conversions remaining today")
-    
-    def increment_usage(self):
+            return self._exceeded_result
+
+        return (True, remaining, '')
+
+    @staticmethod
+    def format_remaining(remaining):
+        """Human-readable remaining-quota message for an allowed request."""
+        return f"{remaining} conversions remaining today"
+
+    def increment_usage(self, return_info=False):
         """
         Increment usage counter after successful conversion.
-        
+
+        A single upsert (SQLite) or INCR (Redis) bumps the shared counter
+        atomically across all worker processes and returns the new value.
+
+        Args:
+            return_info (bool): Build and return the updated usage dict
+
         Returns:
-            dict: Updated usage info
+            dict: Updated usage info if return_info, otherwise None
         """
-        self._check_and_reset_if_needed()
-        
-        self.usage_data['count'] += 1
-        self._save_usage_data()
-        
-        remaining = self.DAILY_LIMIT - self.usage_data['count']
-        
-        logger.info(f"📈 Usage incremented: {self.usage_data['count']}/{self.DAILY_LIMIT} ({remaining} remaining)")
-        
+        with self._lock:
+            self._check_and_reset_if_needed()
+            day = self._today
+            used = self._increment_count(day)
+
+        limit = self.DAILY_LIMIT
+        remaining = limit - used
+
+        # Hot path: skip formatting entirely when INFO is filtered out (typical in production)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("📈 Usage incremented: %d/%d (%d remaining)", used, limit, remaining)
+
+        if not return_info:
+            return None
+
         return {
-            'used': self.usage_data['count'],
-            'limit': self.DAILY_LIMIT,
+            'used': used,
+            'limit': limit,
             'remaining': remaining,
-            'date': self.usage_data['date']
+            'date': day
         }
-    
+
     def get_usage_info(self):
         """
         Get current usage information.
-        
+
         Returns:
-            dict: Usage statistics
+            dict: Usage statistics (shared between calls until the count changes; don't mutate)
         """
-        self._check_and_reset_if_needed()
-        
-        return {
-            'date': self.usage_data['date'],
-            'used': self.usage_data['count'],
-            'limit': self.DAILY_LIMIT,
-            'remaining': self.DAILY_LIMIT - self.usage_data['count'],
-            'percentage': (self.usage_data['count'] / self.DAILY_LIMIT) * 100
-        }
-    
+        with self._lock:
+            self._check_and_reset_if_needed()
+            used = self._read_count()
+            if used != self._info_used:
+                limit = self.DAILY_LIMIT
+                self._info_used = used
+                self._info_cache = {
+                    'date': self._today,
+                    'used': used,
+                    'limit': limit,
+                    'remaining': limit - used,
+                    'percentage': (used / limit) * 100
+                }
+            return self._info_cache
+
     def reset_quota(self):
         """
         Manually reset daily quota (admin function).
-        
+
         Returns:
             dict: Reset confirmation
         """
-        old_count = self.usage_data['count']
-        self.usage_data['count'] = 0
-        self._save_usage_data()
-        
+        with self._lock:
+            self._check_and_reset_if_needed()
+            old_count = self._read_count()
+            # Nothing to write if the counter is already zero
+            if old_count:
+                self._reset_count(self._today)
+
         logger.warning(f"⚠️  Manual quota reset: {old_count} → 0")
-        
+
         return {
             'success': True,
             'message': 'Quota manually reset',
@@ -177,17 +344,20 @@ class DailyUsageTracker:
 
 # Global tracker instance (singleton pattern)
 _tracker_instance = None
+_tracker_lock = threading.Lock()
 
 def get_usage_tracker():
     """
     Get the global usage tracker instance (singleton).
-    
+
     Returns:
         DailyUsageTracker: Global tracker instance
     """
     global _tracker_instance
-    
+
     if _tracker_instance is None:
-        _tracker_instance = DailyUsageTracker()
-    
+        with _tracker_lock:
+            if _tracker_instance is None:
+                _tracker_instance = DailyUsageTracker()
+
     return _tracker_instance